@@ -0,0 +1 @@
+from .load import BenchConfig, BenchReport, LoadGenerator, WebsocketLoadGenerator, MultiplexLoadGenerator, create_app, run
@@ -0,0 +1,30 @@
+import asyncio
+import argparse
+
+from .load import BenchConfig, run
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m miniappi.bench",
+        description="Benchmark Miniappi app with simulated users"
+    )
+    parser.add_argument("--users", type=int, default=100, help="Number of simulated users")
+    parser.add_argument("--messages", type=int, default=10, help="Messages sent by each user")
+    parser.add_argument("--rate", type=float, default=None, help="Messages per second per user")
+    parser.add_argument("--broadcasts", type=int, default=10, help="Messages broadcasted to all users")
+    parser.add_argument("--transport", choices=["mock", "websocket", "multiplex"], default="mock", help="Use mock client or (multiplexed) websockets to a local server")
+    parser.add_argument("--no-memory", action="store_true", help="Don't measure memory per session")
+    parsed = parser.parse_args(args)
+
+    config = BenchConfig(
+        users=parsed.users,
+        messages=parsed.messages,
+        rate=parsed.rate,
+        broadcasts=parsed.broadcasts,
+        measure_memory=not parsed.no_memory,
+    )
+    report = asyncio.run(run(config, transport=parsed.transport))
+    print(report.format())
+
+if __name__ == "__main__":
+    main()
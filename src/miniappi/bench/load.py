@@ -0,0 +1,297 @@
+import time
+import asyncio
+import tracemalloc
+from statistics import quantiles
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Literal
+
+from miniappi.core import App, broadcast, user_context
+from miniappi.core.connection.mock import MockClient
+from miniappi.core.connection.websocket import WebsocketClient
+from miniappi.core.connection.multiplex import MultiplexWebsocketClient
+from miniappi.content import v0
+
+BUTTON_ID = "bench-button"
+REPLY_ID = "bench-reply"
+
+def percentile(values: List[float], q: int) -> float:
+    "Get q-th percentile of the values"
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return quantiles(values, n=100, method="inclusive")[q - 1]
+
+@dataclass
+class BenchConfig:
+    """Load to generate
+
+    Args:
+        users (int):
+            Number of simulated users.
+        messages (int):
+            Messages each user sends. Each
+            message is answered by the app.
+        rate (float, optional):
+            Messages per second per user.
+            By default as fast as possible.
+        broadcasts (int):
+            Number of messages broadcasted
+            to all users.
+        measure_memory (bool):
+            Whether to measure memory used
+            by the sessions. Slows down opening
+            the sessions.
+    """
+    users: int = 100
+    messages: int = 10
+    rate: float | None = None
+    broadcasts: int = 10
+    measure_memory: bool = True
+
+@dataclass
+class BenchReport:
+    "Results of a load run"
+    config: BenchConfig
+    open_latencies: List[float] = field(default_factory=lambda: [])
+    input_latencies: List[float] = field(default_factory=lambda: [])
+    broadcast_duration: float = 0.0
+    messaging_duration: float = 0.0
+    messages_in: int = 0
+    messages_out: int = 0
+    memory_per_session: float | None = None
+
+    @property
+    def messages_in_per_sec(self) -> float:
+        "Messages received by the app per second"
+        return self.messages_in / self.messaging_duration if self.messaging_duration else 0.0
+
+    @property
+    def messages_out_per_sec(self) -> float:
+        "Messages sent by the app per second"
+        duration = self.messaging_duration + self.broadcast_duration
+        return self.messages_out / duration if duration else 0.0
+
+    def format(self) -> str:
+        "Format the report as text"
+        ms = 1000
+        lines = [
+            f"Users:                  {self.config.users}",
+            f"Session open p50/p99:   {percentile(self.open_latencies, 50) * ms:.3f} / {percentile(self.open_latencies, 99) * ms:.3f} ms",
+            f"Input round trip p50/p99: {percentile(self.input_latencies, 50) * ms:.3f} / {percentile(self.input_latencies, 99) * ms:.3f} ms",
+            f"Messages in:            {self.messages_in} ({self.messages_in_per_sec:.0f}/s)",
+            f"Messages out:           {self.messages_out} ({self.messages_out_per_sec:.0f}/s)",
+            f"Broadcast duration:     {self.broadcast_duration * ms:.3f} ms",
+        ]
+        if self.memory_per_session is not None:
+            lines.append(f"Memory per session:     {self.memory_per_session / 1024:.1f} KiB")
+        return "\n".join(lines)
+
+def create_app() -> App:
+    """Create app for benchmarking
+
+    The app shows each user a button and
+    answers every press by showing a title."""
+    app = App()
+    button = v0.widgets.Button(id=BUTTON_ID, label="Press")
+
+    @app.on_open()
+    async def user_opened():
+        await button.show()
+        while True:
+            data = await button.wait_input(show=False)
+            await v0.Title(id=REPLY_ID, text=str(data.get("value"))).show()
+
+    return app
+
+class LoadGenerator:
+    """Simulated users for an app
+
+    The app is run with a mock client
+    and users communicate with it through
+    the client's queues.
+
+    Args:
+        config (BenchConfig): Load to generate.
+        app_factory (callable, optional):
+            Function to create the app. The app
+            should show content on open and
+            answer to each message with ID
+            'bench-button'. By default, the
+            app from ``create_app``.
+    """
+
+    def __init__(self, config: BenchConfig, app_factory: Callable[[], App] = create_app):
+        self.config = config
+        self.app = app_factory()
+        self.client = MockClient()
+        self.app.conn_client = self.client
+        self.report = BenchReport(config=config)
+
+        self._opened: Dict[str, float] = {}
+        self._all_open = asyncio.Event()
+
+    def _request_ids(self):
+        return [f"user-{i}" for i in range(self.config.users)]
+
+    def _response_queue(self, request_id: str) -> asyncio.Queue:
+        url = self.client._get_url(self.app.app_name, request_id)
+        return self.client.response_queue[url]
+
+    async def _add_user(self, request_id: str):
+        await self.client.add_session(app_name=self.app.app_name, request_id=request_id)
+
+    async def _send(self, request_id: str, data: dict):
+        await self.client._add_request(
+            app_name=self.app.app_name,
+            request_id=request_id,
+            msg=data
+        )
+
+    async def _receive(self, request_id: str) -> dict | str:
+        return await self._response_queue(request_id).get()
+
+    async def run(self) -> BenchReport:
+        "Run the benchmark"
+        return await self._run()
+
+    async def _run(self) -> BenchReport:
+        app = self.app
+
+        @app.on_open()
+        async def record_open():
+            self._opened[user_context.request_id] = time.perf_counter()
+            if len(self._opened) == self.config.users:
+                self._all_open.set()
+
+        task = asyncio.create_task(app.start(echo_link=False))
+        try:
+            while not app.is_running:
+                await asyncio.sleep(0.001)
+            await self.open_sessions()
+            await self.run_broadcasts()
+            await self.run_messaging()
+        finally:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                ...
+        return self.report
+
+    async def open_sessions(self):
+        "Open sessions for all users"
+        if self.config.measure_memory:
+            tracemalloc.start()
+            start_memory = tracemalloc.get_traced_memory()[0]
+
+        start_times = {}
+        for request_id in self._request_ids():
+            start_times[request_id] = time.perf_counter()
+            await self._add_user(request_id)
+        if self.config.users:
+            await self._all_open.wait()
+        # Wait for the initial content
+        for request_id in self._request_ids():
+            await self._receive(request_id)
+            self.report.messages_out += 1
+
+        if self.config.measure_memory:
+            memory = tracemalloc.get_traced_memory()[0] - start_memory
+            tracemalloc.stop()
+            self.report.memory_per_session = memory / max(self.config.users, 1)
+
+        self.report.open_latencies = [
+            self._opened[request_id] - start
+            for request_id, start in start_times.items()
+        ]
+
+    async def run_broadcasts(self):
+        "Broadcast messages to all users"
+        start = time.perf_counter()
+        for i in range(self.config.broadcasts):
+            await broadcast(
+                v0.Title(id="bench-broadcast", text=str(i)),
+                self.app.sessions.values()
+            )
+        for request_id in self._request_ids():
+            for _ in range(self.config.broadcasts):
+                await self._receive(request_id)
+                self.report.messages_out += 1
+        self.report.broadcast_duration = time.perf_counter() - start
+
+    async def run_messaging(self):
+        "Send messages from all users and wait replies"
+        start = time.perf_counter()
+        async with asyncio.TaskGroup() as tg:
+            for request_id in self._request_ids():
+                tg.create_task(self._run_user(request_id))
+        self.report.messaging_duration = time.perf_counter() - start
+
+    async def _run_user(self, request_id: str):
+        interval = 1 / self.config.rate if self.config.rate else None
+        for i in range(self.config.messages):
+            sent = time.perf_counter()
+            await self._send(request_id, {"id": BUTTON_ID, "value": i})
+            self.report.messages_in += 1
+            while True:
+                data = await self._receive(request_id)
+                self.report.messages_out += 1
+                if isinstance(data, dict) and data.get("data", {}).get("id") == REPLY_ID:
+                    break
+            self.report.input_latencies.append(time.perf_counter() - sent)
+            if interval is not None:
+                await asyncio.sleep(max(interval - (time.perf_counter() - sent), 0))
+
+class WebsocketLoadGenerator(LoadGenerator):
+    """Simulated users for an app using websockets
+
+    The app is run with the websocket client
+    connected to a local stand-in server
+    thus the messages go through the same
+    encoding and websocket path as with
+    Miniappi server."""
+
+    client_class = WebsocketClient
+
+    def __init__(self, config: BenchConfig, app_factory: Callable[[], App] = create_app):
+        from miniappi.testing.server import LocalServer
+        super().__init__(config, app_factory=app_factory)
+        self.server = LocalServer()
+        self._users = {}
+
+    async def _add_user(self, request_id: str):
+        self._users[request_id] = await self.server.add_user(request_id)
+
+    async def _send(self, request_id: str, data: dict):
+        await self._users[request_id].send(data)
+
+    async def _receive(self, request_id: str) -> dict | str:
+        return await self._users[request_id].receive()
+
+    async def run(self) -> BenchReport:
+        "Run the benchmark"
+        async with self.server.client() as client:
+            self.app.conn_client = self.client_class(client=client)
+            try:
+                return await self._run()
+            finally:
+                await self.server.close()
+
+class MultiplexLoadGenerator(WebsocketLoadGenerator):
+    """Simulated users for an app using
+    multiplexed websockets"""
+
+    client_class = MultiplexWebsocketClient
+
+GENERATORS = {
+    "mock": LoadGenerator,
+    "websocket": WebsocketLoadGenerator,
+    "multiplex": MultiplexLoadGenerator,
+}
+
+async def run(config: BenchConfig | None = None, app_factory: Callable[[], App] = create_app,
+              transport: Literal["mock", "websocket", "multiplex"] = "mock") -> BenchReport:
+    "Run load benchmark"
+    generator = GENERATORS[transport](config or BenchConfig(), app_factory=app_factory)
+    return await generator.run()
@@ -0,0 +1,74 @@
+import timeit
+from contextvars import ContextVar
+from typing import Callable, Dict
+
+from miniappi.core.context import UserContext
+
+def time_per_call(func: Callable[[], object], number: int) -> float:
+    "Best time (nanoseconds) per call of the function"
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    return best / number * 1e9
+
+def bench_context(number: int = 200_000) -> Dict[str, float]:
+    "Time reading and writing context fields"
+    ctx = UserContext()
+    var = ContextVar("baseline")
+    results = {}
+    with ctx.enter({"session": None, "request_id": "1"}):
+        token = var.set({"request_id": "1"})
+        results["ContextVar.get()[key] (baseline)"] = time_per_call(lambda: var.get()["request_id"], number)
+        var.reset(token)
+        results["context field read"] = time_per_call(lambda: ctx.request_id, number)
+
+        def write():
+            ctx.request_id = "2"
+        results["context field write"] = time_per_call(write, number)
+    return results
+
+def bench_session_open(number: int = 20_000, n_vars: int = 1000) -> Dict[str, float]:
+    "Time entering the contexts of a session with many context variables set"
+    from types import SimpleNamespace
+    from contextlib import ExitStack
+    from miniappi.core import App
+
+    app = App()
+    session = SimpleNamespace(start_args=SimpleNamespace(request_id="1"))
+    # Variables set by the app or other libraries
+    for i in range(n_vars):
+        ContextVar(f"var-{i}").set(i)
+
+    def open_session():
+        with ExitStack() as stack:
+            for ctx in app.get_channel_context_managers(session):
+                stack.enter_context(ctx)
+    return {
+        f"session contexts enter/exit ({n_vars} vars)": time_per_call(open_session, number)
+    }
+
+BENCHMARKS = {
+    "context": bench_context,
+    "session": bench_session_open,
+}
+
+def run(names=None) -> Dict[str, float]:
+    "Run microbenchmarks"
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results.update(func())
+    return results
+
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="python -m miniappi.bench.micro",
+        description="Microbenchmarks of Miniappi internals"
+    )
+    parser.add_argument("names", nargs="*", choices=list(BENCHMARKS), help="Benchmarks to run (by default all)")
+    parsed = parser.parse_args(args)
+    for name, ns in run(parsed.names).items():
+        print(f"{name:<40} {ns:8.1f} ns")
+
+if __name__ == "__main__":
+    main()
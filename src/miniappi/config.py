@@ -1,5 +1,6 @@
 from pathlib import Path
 from importlib.metadata import version, PackageNotFoundError
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -11,6 +12,7 @@ class Settings(BaseSettings):
     url_start: str = "https://miniappi.com/api/v1/streams/apps/start"
     url_recover: str = "https://miniappi.com/api/v1/streams/apps/recover"
     url_apps: str = "https://miniappi.com/apps"
+    url_multiplex: str = "https://miniappi.com/api/v1/streams/apps/multiplex"
 
     echo_url: bool | None = True
 
@@ -18,6 +20,61 @@ class Settings(BaseSettings):
     keepalive_ping_timeout: float | None = 20.0
     timeout: float | None = None
 
+    # App-level websockets used by MultiplexWebsocketClient
+    multiplex_connections: int = 4
+
+    broadcast_concurrency: int | None = 100
+    broadcast_timeout: float | None = None
+
+    # Outbound queue per session. None sends
+    # directly and 0 means unbounded queue
+    send_queue_size: int | None = None
+    send_queue_policy: Literal["block", "drop-oldest", "disconnect"] = "block"
+    # Seconds to collect outbound messages for merging
+    # (merged pushes require the UI to support extend).
+    # Uses outbound queue (unbounded if size not set)
+    send_coalesce_window: float | None = None
+    # Send only the changed parts of shown content
+    # (requires the UI to support puts by content ID)
+    content_diff: bool = False
+    # Keep the content each user has (Session.content)
+    content_mirror: bool = False
+
+    # How user messages are passed to on_message callbacks
+    message_dispatch: Literal["sequential", "concurrent", "pool"] = "sequential"
+    message_workers: int = 8
+
+    # Pools for sync callbacks (executor="thread" or
+    # "process"). None uses the defaults of Python
+    thread_pool_size: int | None = None
+    process_pool_size: int | None = None
+    process_pool_start_method: Literal["fork", "spawn", "forkserver"] | None = None
+
+    # Socket to share sessions with other
+    # processes of the app (None: not shared)
+    registry_path: str | None = None
+
+    # Processes for ShardedApp (None: number of CPUs)
+    shard_workers: int | None = None
+    shard_balance: Literal["round-robin", "least-loaded"] = "least-loaded"
+    shard_start_method: Literal["fork", "spawn", "forkserver"] | None = None
+    # Seconds to wait for the shards to close their sessions
+    shard_stop_timeout: float | None = 5.0
+
+    # JSON codec of the websocket frames
+    # (auto: orjson or msgspec if installed)
+    json_codec: Literal["auto", "json", "orjson", "msgspec"] = "auto"
+
+    # Seconds between the logged message counts
+    # of a session (None: only when the session ends).
+    # Each message is logged only on DEBUG level
+    log_summary_interval: float | None = 60.0
+
+    # Port to serve the metrics in Prometheus
+    # format (None: not served)
+    metrics_port: int | None = None
+    metrics_host: str = "127.0.0.1"
+
     @property
     def version(self):
         "Version of Miniappi"
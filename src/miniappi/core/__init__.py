@@ -7,3 +7,4 @@ from .context import (
     ContextModel
 )
 from .models.content import BaseContent
+from .broadcast import broadcast, BroadcastResult
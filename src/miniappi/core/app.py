@@ -4,18 +4,25 @@ import logging
 from dataclasses import asdict
 from contextlib import ExitStack, contextmanager
 from types import TracebackType
-from typing import List, Dict, Any, Awaitable, Type, Generic, TypeVar, ContextManager
+from typing import List, Dict, Any, Awaitable, Type, Generic, TypeVar, ContextManager, Iterable
+from concurrent.futures import Executor
 from functools import partial
 from collections.abc import Callable
 
 from miniappi.core.models.callbacks import OnMessageConfig, OnOpenConfig
-from miniappi.core.exceptions import UserLeftException, CloseStreamException
+from miniappi.core.exceptions import UserLeftException, CloseStreamException, SendQueueFullException
 from . import connection as conn
 from .connection import Message, ServerConf, ClientConf, UserSessionArgs
 from miniappi.config import settings
+from miniappi import metrics
 from miniappi.core.models.context import Context
 from miniappi.core.context import app_context as default_app_context, user_context as default_user_context
 from .session import Session
+from .dispatch import DispatchMode
+from .router import MessageRouter
+from .registry import SessionRegistry, create_registry
+from .executor import ExecutorKind, create_executor
+from .tracing import Tracer
 
 from rich import print
 from rich.panel import Panel
@@ -51,6 +58,20 @@ class App:
             to keep track on app level data.
             This is automatically
             scoped and can be set globally.
+        message_dispatch ('sequential', 'concurrent', 'pool', optional):
+            How user messages are passed to the
+            message callbacks. Sequential handles
+            a user's messages one at a time while
+            concurrent and pool (fixed number of
+            workers) let slow callbacks run
+            without blocking other input. Messages
+            of the same content are always handled
+            in order. By default from settings.
+        registry (SessionRegistry, optional):
+            Registry of the sessions. Set to share
+            the sessions with other processes of the
+            app (ie. ``UnixSocketRegistry``). By default
+            from settings (only this process).
 
     Examples:
         ```python
@@ -71,13 +92,20 @@ class App:
 
     conn_client: conn.base.AbstractClient = conn.websocket.WebsocketClient()
 
+    # Spans of sessions and messages (no-op by default)
+    tracer: Tracer = Tracer()
+
     def __init__(self, app_name: str | None = None,
                  user_context: Context | None = None,
-                 app_context: Context | None = None):
+                 app_context: Context | None = None,
+                 message_dispatch: DispatchMode | None = None,
+                 registry: SessionRegistry | None = None):
         self.app_name = app_name
+        self.message_dispatch = message_dispatch
+        self.registry = registry if registry is not None else create_registry()
 
         self.callbacks_start = []
-        self.callbacks_message: List[Callable[[Message], Awaitable[Any]]] = []
+        self.callbacks_message = MessageRouter()
         self.callbacks_open: List[Callable[..., Awaitable[Any]]] = []
         self.callbacks_close: List[CloseCallback] = []
         self.callbacks_end: List[CloseCallback] = []
@@ -85,8 +113,12 @@ class App:
         self.app_context_managers: List[ContextManager] = []
         self.channel_context_managers: List[ContextManager] = []
 
-        self.sessions: Dict[str, Session] = {}
+        # Sessions in this process
+        self.sessions: Dict[str, Session] = self.registry.sessions
+        self.executors: Dict[ExecutorKind, Executor] = {}
         self.is_running = False
+        # Port to serve the metrics of this process
+        self.metrics_port: int | None = settings.metrics_port
 
         self.channel_context = user_context
         self.app_context = app_context
@@ -116,6 +148,7 @@ class App:
         init_args = dict(
             app=self,
             sessions=self.sessions,
+            registry=self.registry,
             **asdict(conf)
         )
         ctx = [
@@ -161,6 +194,10 @@ class App:
         "Start app async"
         logger = self.get_logger("init")
 
+        await self.registry.start(self)
+        metrics_server = None
+        if self.metrics_port is not None:
+            metrics_server = await metrics.start_http_server(self.metrics_port, host=settings.metrics_host)
         with ExitStack() as app_stack:
             try:
                 async with asyncio.TaskGroup() as tg:
@@ -178,37 +215,71 @@ class App:
                 await self._run_end()
             finally:
                 self.is_running = False
+                await self.registry.close()
+                self.shutdown_executors()
+                if metrics_server is not None:
+                    metrics_server.close()
 
     async def open_session(self, start_args: UserSessionArgs):
         logger = self.get_logger("session")
-        async with self.conn_client.connect_user(start_args) as conn:
-            session = self.cls_session(
-                start_conn=conn,
-                start_args=start_args,
-                callbacks_message=self.callbacks_message,
-
-                sessions=self.sessions
-            )
+        tracer = self.tracer
+        request_id = start_args.request_id
+        span_open = tracer.start("miniappi.session.open", request_id=request_id)
+        span_connect = tracer.start("miniappi.session.connect", request_id=request_id)
+        try:
+            async with self.conn_client.connect_user(start_args) as conn:
+                span_connect.end()
+                session = self.cls_session(
+                    start_conn=conn,
+                    start_args=start_args,
+                    callbacks_message=self.callbacks_message,
+
+                    sessions=self.sessions,
+                    dispatch=self.message_dispatch,
+                    tracer=tracer,
+                )
 
-            with ExitStack() as channel_stack:
-                for channel_context in self.get_channel_context_managers(session):
-                    channel_stack.enter_context(channel_context)
-                try:
-                    async with asyncio.TaskGroup() as tg:
-                        session.tasks.append(tg.create_task(session.listen()))
-                        for stream in self.callbacks_open:
-                            args = []
-                            if stream.pass_session:
-                                args.append(session)
-                            session.tasks.append(tg.create_task(stream(*args)))
-                        logger.info(f"Session opened for client: {start_args.request_id}")
-                except* UserLeftException as exc:
-                    logger.info("User session closed by the user")
-                    await session.close(send_stop=False)
-                else:
-                    await session.close()
-                finally:
-                    await self._run_close()
+                with ExitStack() as channel_stack:
+                    # Undone in the finally below
+                    metrics.sessions_opened.inc()
+                    metrics.sessions_active.inc()
+                    try:
+                        await self.registry.join(start_args.request_id)
+                        with tracer.start("miniappi.session.enter_context", request_id=request_id):
+                            for channel_context in self.get_channel_context_managers(session):
+                                channel_stack.enter_context(channel_context)
+                        async with asyncio.TaskGroup() as tg:
+                            with tracer.start("miniappi.session.start_callbacks", request_id=request_id, callbacks=len(self.callbacks_open)):
+                                session.tasks.append(tg.create_task(session.listen()))
+                                session.start_writer(tg)
+                                for stream in self.callbacks_open:
+                                    args = []
+                                    if stream.pass_session:
+                                        args.append(session)
+                                    session.tasks.append(tg.create_task(stream(*args)))
+                            span_open.end()
+                            logger.info(f"Session opened for client: {start_args.request_id}")
+                    except* UserLeftException as exc:
+                        logger.info("User session closed by the user")
+                        await session.close(send_stop=False)
+                    except* SendQueueFullException as exc:
+                        logger.warning("User session closed as the user could not keep up")
+                        await session.close(send_stop=False)
+                    else:
+                        await session.close()
+                    finally:
+                        if not session.is_closed:
+                            # Failed before the callbacks
+                            await session.close(send_stop=False)
+                        metrics.sessions_active.dec()
+                        metrics.sessions_closed.inc()
+                        await self.registry.leave(start_args.request_id)
+                        await self._run_close()
+        except BaseException as exc:
+            # Failed before the session was opened
+            span_connect.end(exc)
+            span_open.end(exc)
+            raise
 
     async def _run_start(self, tg: asyncio.TaskGroup):
         for cb in self.callbacks_start:
@@ -222,6 +293,18 @@ class App:
         for cb in self.callbacks_close:
             await cb(*sys.exc_info())
 
+    def get_executor(self, kind: ExecutorKind) -> Executor:
+        "Get pool for sync callbacks (created on first use)"
+        if kind not in self.executors:
+            self.executors[kind] = create_executor(kind)
+        return self.executors[kind]
+
+    def shutdown_executors(self):
+        "Stop the pools of the app"
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.executors = {}
+
     def get_logger(self, name: str):
         name = f".{name}" if name else ""
         return logging.getLogger(__name__ + name)
@@ -254,21 +337,48 @@ class App:
         with temp_app(self) as t:
             yield t
 
-    def on_message(self):
+    def on_message(self, id: str | Iterable[str] | None = None, request_id: str | None = None,
+                   executor: ExecutorKind | None = None):
         """Callback for user sending a message (data).
 
+        Args:
+            id (str, list of str, optional):
+                Content ID(s) to receive messages
+                from. By default all.
+            request_id (str, optional):
+                User session (request ID) to
+                receive messages from. By default
+                all.
+            executor ('thread', 'process', optional):
+                Run a sync callback in a thread or
+                process pool of the app so that it
+                does not block other users. By default
+                the callback is a coroutine.
+
         Examples
         --------
         ```python
         @app.on_message()
         async def new_message(msg):
             ...
+
+        @app.on_message(id="my-button")
+        async def button_pressed(msg):
+            ...
+
+        @app.on_message(id="my-button", executor="thread")
+        def button_pressed_sync(msg):
+            ...
         ```
         """
+        ids = [id] if isinstance(id, str) else id
         def wrapper(func: Callable[[dict], Awaitable[Any]]):
             self.callbacks_message.append(
                 OnMessageConfig(
                     func=func,
+                    ids=ids,
+                    request_id=request_id,
+                    executor=executor,
                 )
             )
             return func
@@ -290,23 +400,37 @@ class App:
             return func
         return wrapper
 
-    def on_open(self, pass_session=False):
+    def on_open(self, pass_session=False, executor: ExecutorKind | None = None):
         """Callback for user opening an app
         session (user connected to the app)
 
+        Args:
+            pass_session (bool):
+                Whether to pass the session to
+                the callback.
+            executor ('thread', 'process', optional):
+                Run a sync callback in a thread or
+                process pool of the app. By default
+                the callback is a coroutine.
+
         Examples
         --------
         ```python
         @app.on_open()
         async def new_user(session):
             ...
+
+        @app.on_open(executor="thread")
+        def new_user_sync():
+            ...
         ```
         """
         def wrapper(func: Callable[..., Awaitable[Any]]):
             self.callbacks_open.append(
                 OnOpenConfig(
                     func=func,
-                    pass_session=pass_session
+                    pass_session=pass_session,
+                    executor=executor,
                 )
             )
             return func
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set
+from pydantic import BaseModel
+
+from miniappi.config import settings
+from .context import app_context
+from .connection import EncodedMessage
+from .session import Session, encode_message
+
+LOGGER = logging.getLogger(__name__)
+
+# Closes of timed out sessions run in the background
+_closing: Set[asyncio.Task] = set()
+
+@dataclass
+class BroadcastResult:
+    "Outcome of a broadcast"
+    sent: List[str] = field(default_factory=lambda: [])
+    failed: Dict[str, BaseException] = field(default_factory=lambda: {})
+
+    @property
+    def ok(self) -> bool:
+        "Whether all sessions received the message"
+        return not self.failed
+
+async def broadcast(data: dict | BaseModel | EncodedMessage,
+                    sessions: Iterable[Session] | None = None,
+                    *,
+                    concurrency: int | None = None,
+                    timeout: float | None = None) -> BroadcastResult:
+    """Send a message to many sessions concurrently
+
+    The message is formatted only once and
+    then sent to the sessions concurrently.
+    A session that fails or times out does
+    not stop the others. A session that times
+    out is closed (without sending the stop
+    message) after the others are done as the
+    message may have been cut off in the middle
+    of a frame. If the broadcast runs in a task
+    of such a session, the session is closed in
+    a separate task.
+
+    Args:
+        data (dict, BaseModel):
+            Message or content to send.
+        sessions (iterable of Session, optional):
+            Sessions to send to. By default,
+            all sessions of the app (including
+            sessions in other shards).
+        concurrency (int, optional):
+            Maximum number of sends in flight.
+            By default from settings.
+        timeout (float, optional):
+            Timeout (seconds) for a single
+            session. By default from settings.
+
+    Returns:
+        BroadcastResult: sessions sent to and
+        sessions failed with the exception.
+    """
+    relay = sessions is None
+    if sessions is None:
+        sessions = app_context.sessions.values()
+    # Copy as the sessions may change while sending
+    sessions = list(sessions)
+    concurrency = settings.broadcast_concurrency if concurrency is None else concurrency
+    timeout = settings.broadcast_timeout if timeout is None else timeout
+
+    result = BroadcastResult()
+    # Encode only once for all sessions (they
+    # share the connection client and its codec)
+    body = encode_message(data, codec=sessions[0].codec if sessions else None)
+    if relay:
+        # Sessions of the app in other processes
+        await app_context.registry.publish(body)
+    if not sessions:
+        return result
+
+    limit = asyncio.Semaphore(concurrency) if concurrency else None
+    timed_out: List[Session] = []
+
+    async def send(session: Session):
+        try:
+            if limit is None:
+                async with asyncio.timeout(timeout):
+                    await session.send(body)
+            else:
+                async with limit, asyncio.timeout(timeout):
+                    await session.send(body)
+        except TimeoutError as exc:
+            result.failed[session.request_id] = exc
+            timed_out.append(session)
+        except Exception as exc:
+            result.failed[session.request_id] = exc
+        else:
+            result.sent.append(session.request_id)
+
+    if len(sessions) == 1:
+        await send(sessions[0])
+    else:
+        await asyncio.gather(*(send(session) for session in sessions))
+
+    for session in timed_out:
+        # The user may have got a partial frame
+        LOGGER.warning(f"Closing session {session.request_id!r} that timed out in broadcast")
+        if asyncio.current_task() in session.tasks:
+            # Closing cancels the task running this
+            task = asyncio.create_task(session.close(send_stop=False))
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+        else:
+            await session.close(send_stop=False)
+
+    if result.failed:
+        LOGGER.warning(
+            f"Broadcast failed for {len(result.failed)}/{len(sessions)} sessions"
+        )
+    return result
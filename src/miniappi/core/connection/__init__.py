@@ -1,8 +1,9 @@
-from . import base, websocket
+from . import base, codec, websocket, multiplex
 from .base import (
     AbstractClient,
     AbstractUserConnection,
     Message,
+    EncodedMessage,
     ClientConf,
     ServerConf,
     UserSessionArgs,
@@ -1,3 +1,5 @@
+import hashlib
+from functools import cached_property
 from typing import Generic, TypeVar, AsyncGenerator, Callable, Self, AsyncContextManager, AsyncIterator, Any
 from dataclasses import dataclass, asdict
 from contextlib import asynccontextmanager
@@ -5,6 +7,7 @@ from abc import ABC, abstractmethod
 from pydantic import BaseModel
 
 from miniappi.config import settings
+from .codec import Codec, default_codec
 
 ConnectionT = TypeVar("ConnectionT")
 SessionT = TypeVar("SessionT")
@@ -19,6 +22,37 @@ class Message:
     request_id: str | None
     data: dict
 
+@dataclass(frozen=True)
+class EncodedMessage:
+    """Message encoded for sending
+
+    Encoding is done once so the same
+    message can be sent to many users
+    without formatting it again."""
+    data: dict | str
+    text: str
+
+    @classmethod
+    def encode(cls, data: dict | str, codec: Codec | None = None):
+        "Encode JSON serializable data"
+        if codec is None:
+            codec = default_codec()
+        return cls(data=data, text=codec.dumps(data))
+
+    @classmethod
+    def from_json(cls, text: str | bytes, codec: Codec | None = None):
+        "Create from already encoded JSON (not encoded again when sent)"
+        if codec is None:
+            codec = default_codec()
+        if isinstance(text, bytes):
+            text = text.decode()
+        return cls(data=codec.loads(text), text=text)
+
+    @cached_property
+    def digest(self) -> str:
+        "Hash of the encoded content"
+        return hashlib.blake2b(self.text.encode(), digest_size=16).hexdigest()
+
 @dataclass
 class ServerConf:
     "Config given by Miniappi server"
@@ -33,8 +67,12 @@ class ClientConf:
 
 class AbstractUserConnection(ABC):
 
+    # Codec the session encodes the outbound messages with
+    # (None: the default codec)
+    codec: Codec | None = None
+
     @abstractmethod
-    async def send(self, data: dict):
+    async def send(self, data: dict | EncodedMessage):
         "Send a message to a user"
         ...
 
@@ -54,3 +92,7 @@ class AbstractClient(ABC):
     async def listen_app(self, config: ClientConf, setup_start: Callable[[ServerConf, ...], Any]) -> AsyncIterator[Message]:
         "Connect the app and listen session starts"
         ...
+
+    def set_server_conf(self, conf: ServerConf):
+        "Take the server config (if the app connection is made elsewhere)"
+        ...
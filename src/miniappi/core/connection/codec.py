@@ -0,0 +1,94 @@
+import json
+from typing import Any, Literal
+
+from miniappi.config import settings
+
+type CodecName = Literal["auto", "json", "orjson", "msgspec"]
+
+class Codec:
+    """JSON codec of the websocket frames
+
+    Uses the standard library. Faster codecs
+    are used if their package is installed
+    (see ``create_codec``)."""
+
+    name = "json"
+
+    def dumps(self, data: Any) -> str:
+        "Encode data to JSON text"
+        return json.dumps(data)
+
+    def loads(self, text: str | bytes) -> Any:
+        "Decode JSON text"
+        return json.loads(text)
+
+class OrjsonCodec(Codec):
+    "Codec using orjson"
+
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._dumps = orjson.dumps
+        # Keys like the standard library (ie. int keys)
+        self._option = orjson.OPT_NON_STR_KEYS
+        self.loads = orjson.loads
+
+    def dumps(self, data: Any) -> str:
+        return self._dumps(data, option=self._option).decode()
+
+class MsgspecCodec(Codec):
+    "Codec using msgspec"
+
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+        self.loads = self._decoder.decode
+
+    def dumps(self, data: Any) -> str:
+        try:
+            return self._encoder.encode(data).decode()
+        except TypeError:
+            # Keys the standard library
+            # accepts (ie. None or bool keys)
+            return json.dumps(data)
+
+CODECS: dict[str, type[Codec]] = {
+    "json": Codec,
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+}
+
+def create_codec(name: CodecName | Codec | None = None) -> Codec:
+    """Create a codec
+
+    Args:
+        name (str, optional):
+            ``json``, ``orjson``, ``msgspec`` or ``auto``
+            (the fastest installed). By default
+            ``settings.json_codec``.
+    """
+    if isinstance(name, Codec):
+        return name
+    if name is None:
+        name = settings.json_codec
+    if name != "auto":
+        return CODECS[name]()
+    for cls in (OrjsonCodec, MsgspecCodec):
+        try:
+            return cls()
+        except ImportError:
+            continue
+    return Codec()
+
+_default: Codec | None = None
+
+def default_codec() -> Codec:
+    "Get the codec set in the settings"
+    global _default
+    if _default is None:
+        _default = create_codec()
+    return _default
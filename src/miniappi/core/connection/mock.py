@@ -8,7 +8,8 @@ from abc import ABC, abstractmethod
 from .base import (
     AbstractClient, AbstractUserConnection,
     ClientConf, ServerConf,
-    Message, UserSessionArgs
+    Message, UserSessionArgs,
+    EncodedMessage
 )
 
 from miniappi.config import settings
@@ -23,8 +24,10 @@ class MockUserConnection(AbstractUserConnection):
         self._client = client
         self._start_args = start_args
 
-    async def send(self, data: dict):
+    async def send(self, data: dict | EncodedMessage):
         "Send a message to a user"
+        if isinstance(data, EncodedMessage):
+            data = data.data
         url = self._start_args.user_url
         await self._client.response_queue[
             url
@@ -36,20 +39,18 @@ class MockUserConnection(AbstractUserConnection):
         "Listen messages from the user"
         request_id = self._start_args.request_id
         url = self._start_args.user_url
+        # Created if not yet exists so we can
+        # wait without polling
+        queue = self._client.request_queue[url]
         while True:
-            queue = self._client.request_queue
-            this_queue = queue.get(
-                url
+            next_msg = await queue.get()
+            msg = Message(
+                url=url,
+                request_id=request_id,
+                data=next_msg
             )
-            if this_queue is not None:
-                next_msg = await this_queue.get()
-                msg = Message(
-                    url=url,
-                    request_id=request_id,
-                    data=next_msg
-                )
-                self._client.received.append(msg)
-                yield msg
+            self._client.received.append(msg)
+            yield msg
             await asyncio.sleep(0)
 
 class MockClient(AbstractClient):
@@ -71,7 +72,11 @@ class MockClient(AbstractClient):
     @asynccontextmanager
     async def connect_user(self, args: MockUserSessionArgs):
         "Connect with a user"
-        yield MockUserConnection(self, start_args=args)
+        try:
+            yield MockUserConnection(self, start_args=args)
+        finally:
+            # Nothing reads the requests anymore
+            self.request_queue.pop(args.user_url, None)
 
     async def listen_app(self, config: ClientConf, setup_start: Callable[[ServerConf, ...], Any]) -> AsyncIterator[Message]:
         "Connect the app and listen session starts"
@@ -84,14 +89,11 @@ class MockClient(AbstractClient):
             )
         )
 
+        queue = self.session_queue[self._get_url(app_name)]
         while True:
-            queue = self.session_queue
-            this_queue = queue.get(self._get_url(app_name))
-            if this_queue is not None:
-                next_msg = await this_queue.get()
-
-                self.received.append(next_msg)
-                yield MockUserSessionArgs(**next_msg)
+            next_msg = await queue.get()
+            self.received.append(next_msg)
+            yield MockUserSessionArgs(**next_msg)
             await asyncio.sleep(0)
 
     async def add_session(self, app_name: str, request_id: str):
@@ -0,0 +1,240 @@
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List
+from httpx_ws import aconnect_ws, AsyncWebSocketSession, WebSocketDisconnect
+from httpx import AsyncClient
+
+from miniappi.core.logging import Loggers, FrameLog
+from miniappi.core.exceptions import UserLeftException
+from .base import (
+    AbstractUserConnection,
+    ServerConf,
+    ClientConf,
+    Message,
+    EncodedMessage,
+)
+from .websocket import WebsocketClient, WebsocketUserSessionArgs
+from .codec import Codec, CodecName, default_codec
+from miniappi.config import settings
+from miniappi import metrics
+
+LOGGER = logging.getLogger(Loggers.connection.value)
+LOGGER_USER = logging.getLogger(Loggers.user_connection.value)
+
+_OFF = object()
+
+def _frame(type: str, request_id: str, data: dict | EncodedMessage | None = None, dumps: Callable[[Any], str] = json.dumps) -> str:
+    "Format a frame of a multiplexed channel"
+    head = '{"type":' + json.dumps(type) + ',"request_id":' + json.dumps(request_id)
+    if data is None:
+        return head + "}"
+    # Encoded messages are put to the frame as is
+    # so that broadcasts are not encoded again
+    text = data.text if isinstance(data, EncodedMessage) else dumps(data)
+    return head + ',"data":' + text + "}"
+
+class MultiplexChannel:
+    """App-level websocket carrying many user sessions
+
+    Frames are JSON objects with keys ``type``,
+    ``request_id`` and ``data``. The app opens a
+    session on the channel with type ``open``,
+    sends messages with ``data`` and closes the
+    session with ``close``. The server sends user
+    messages with ``data`` and user leaving with
+    ``off``.
+    """
+
+    def __init__(self, url: str, client: AsyncClient, codec: Codec | None = None):
+        self.url = url
+        self.client = client
+        self.codec = codec if codec is not None else default_codec()
+        self.sessions: Dict[str, asyncio.Queue] = {}
+        self.ready = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self._ws: AsyncWebSocketSession | None = None
+
+    def start(self):
+        "Connect the channel in a background task"
+        self.task = asyncio.create_task(self._run())
+
+    async def wait_ready(self):
+        "Wait till the channel is connected"
+        ready = asyncio.create_task(self.ready.wait())
+        await asyncio.wait((ready, self.task), return_when=asyncio.FIRST_COMPLETED)
+        if not ready.done():
+            ready.cancel()
+            # Connecting failed
+            await self.task
+
+    @property
+    def is_closed(self) -> bool:
+        return self.task is not None and self.task.done()
+
+    async def open(self, request_id: str) -> asyncio.Queue:
+        "Open a user session on the channel"
+        queue = self.sessions[request_id] = asyncio.Queue()
+        await self._ws.send_text(_frame("open", request_id))
+        return queue
+
+    async def close(self, request_id: str):
+        "Close a user session on the channel"
+        self.sessions.pop(request_id, None)
+        if not self.is_closed:
+            await self._ws.send_text(_frame("close", request_id))
+
+    async def send(self, request_id: str, data: dict | EncodedMessage):
+        "Send a message to a user"
+        await self._ws.send_text(_frame("data", request_id, data, dumps=self.codec.dumps))
+
+    async def _run(self):
+        try:
+            async with aconnect_ws(
+                self.url,
+                client=self.client,
+                keepalive_ping_interval_seconds=settings.keepalive_ping_interval,
+                keepalive_ping_timeout_seconds=settings.keepalive_ping_timeout
+            ) as ws:
+                self._ws = ws
+                self.ready.set()
+                await self._route(ws)
+        except asyncio.CancelledError:
+            # App is closing
+            self._end_sessions(_OFF)
+            raise
+        except Exception as exc:
+            # Sessions on the channel cannot continue
+            self._end_sessions(exc)
+            if not self.ready.is_set():
+                raise
+            LOGGER.warning(f"Multiplexed channel closed: {exc!r}")
+
+    def _end_sessions(self, reason: Any):
+        for queue in self.sessions.values():
+            queue.put_nowait(reason)
+
+    async def _route(self, ws: AsyncWebSocketSession):
+        while True:
+            text = await ws.receive_text()
+            if text.lower() == "ping":
+                LOGGER.debug("Received a ping message")
+                continue
+            frame = self.codec.loads(text)
+            queue = self.sessions.get(frame["request_id"])
+            if queue is None:
+                LOGGER.debug("Received a frame for a closed session")
+                continue
+            if frame["type"] == "off":
+                queue.put_nowait(_OFF)
+            else:
+                metrics.bytes_in.inc(len(text))
+                queue.put_nowait(frame["data"])
+
+class MultiplexUserConnection(AbstractUserConnection):
+
+    def __init__(self, channel: MultiplexChannel, queue: asyncio.Queue, start_args: WebsocketUserSessionArgs):
+        self.channel = channel
+        self.codec = channel.codec
+        self.queue = queue
+        self.start_args = start_args
+        self.frames = FrameLog(LOGGER_USER, start_args.request_id, interval=settings.log_summary_interval)
+
+    async def send(self, data: dict | EncodedMessage):
+        "Send a message to a user"
+        await self.channel.send(self.start_args.request_id, data)
+        self.frames.sent()
+
+    async def listen(self):
+        "Listen messages from the user"
+        while True:
+            msg = await self.queue.get()
+            if msg is _OFF:
+                LOGGER_USER.info("User left")
+                raise UserLeftException("Server closed the session")
+            if isinstance(msg, WebSocketDisconnect) and msg.code in (1000, 1001):
+                LOGGER_USER.info("User session closed by server")
+                raise UserLeftException(msg.reason)
+            if isinstance(msg, BaseException):
+                LOGGER_USER.error("Multiplexed channel closed")
+                raise msg
+            self.frames.received()
+            yield Message(
+                url=self.start_args.user_url,
+                request_id=self.start_args.request_id,
+                data=msg
+            )
+            await asyncio.sleep(0)
+
+class MultiplexWebsocketClient(WebsocketClient):
+    """Websocket client carrying user sessions
+    over few app-level connections
+
+    Instead of opening a websocket for each
+    user, the sessions are opened on a fixed
+    number of channels and the frames are
+    routed by request ID. Requires the server
+    to support the multiplex endpoint
+    (``settings.url_multiplex``).
+
+    Args:
+        client (httpx.AsyncClient, optional): HTTP client.
+        connections (int, optional):
+            Number of app-level websockets. By default
+            ``settings.multiplex_connections``.
+        codec (str or Codec, optional):
+            JSON codec of the frames. By default
+            ``settings.json_codec``.
+    """
+
+    def __init__(self, client: AsyncClient | None = None, connections: int | None = None, codec: CodecName | Codec | None = None):
+        super().__init__(client=client, codec=codec)
+        self.n_connections = connections or settings.multiplex_connections
+        self.channels: List[MultiplexChannel] = []
+        self.app_name: str | None = None
+        self._lock = asyncio.Lock()
+
+    def set_server_conf(self, conf: ServerConf):
+        self.app_name = conf.app_name
+
+    async def _get_channel(self) -> MultiplexChannel:
+        if self.app_name is None:
+            raise RuntimeError("App name not known, cannot open multiplexed channels")
+        async with self._lock:
+            self.channels = [channel for channel in self.channels if not channel.is_closed]
+            if len(self.channels) < self.n_connections:
+                channel = MultiplexChannel(
+                    f"{settings.url_multiplex}/{self.app_name}",
+                    client=self.client,
+                    codec=self.codec,
+                )
+                channel.start()
+                await channel.wait_ready()
+                self.channels.append(channel)
+                return channel
+            return min(self.channels, key=lambda channel: len(channel.sessions))
+
+    @asynccontextmanager
+    async def connect_user(self, start_args: WebsocketUserSessionArgs):
+        channel = await self._get_channel()
+        queue = await channel.open(start_args.request_id)
+        conn = MultiplexUserConnection(channel, queue, start_args)
+        try:
+            yield conn
+        finally:
+            conn.frames.close()
+            await channel.close(start_args.request_id)
+
+    async def listen_app(self, conf: ClientConf, setup_start: Callable[[ServerConf, ...], Any]):
+        async def setup_channels(server_conf: ServerConf):
+            self.set_server_conf(server_conf)
+            await setup_start(server_conf)
+        try:
+            async for start_args in super().listen_app(conf, setup_channels):
+                yield start_args
+        finally:
+            for channel in self.channels:
+                if channel.task is not None:
+                    channel.task.cancel()
+            self.channels = []
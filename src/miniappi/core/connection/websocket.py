@@ -9,7 +9,7 @@ from httpx_ws import aconnect_ws, AsyncWebSocketSession, WebSocketNetworkError,
 from httpx import AsyncClient
 import httpcore
 
-from miniappi.core.logging import Loggers
+from miniappi.core.logging import Loggers, FrameLog
 
 from miniappi.core.exceptions import UserLeftException
 from .base import (
@@ -18,9 +18,13 @@ from .base import (
     ServerConf,
     ClientConf,
     UserSessionArgs,
-    Message
+    Message,
+    EncodedMessage,
 )
+from .codec import Codec, CodecName, create_codec, default_codec
 from miniappi.config import settings
+from miniappi import metrics
+from miniappi.metrics import Counter
 
 LOGGER = logging.getLogger(Loggers.connection.value)
 LOGGER_USER = logging.getLogger(Loggers.user_connection.value)
@@ -34,9 +38,11 @@ class WebsocketUserSessionArgs(UserSessionArgs):
 class RecoveryConf:
     recovery_key: str
 
-async def _listen_messages(ws: AsyncWebSocketSession):
+async def _listen_messages(ws: AsyncWebSocketSession, received: Counter | None = None, loads: Callable[[str], Any] = json.loads):
     while True:
         data = await ws.receive_text()
+        if received is not None:
+            received.inc(len(data))
         if data.lower() == "off":
             # Users disconnected
             LOGGER.debug("Received a close message")
@@ -44,26 +50,31 @@ async def _listen_messages(ws: AsyncWebSocketSession):
         elif data.lower() == "ping":
             LOGGER.debug("Received a ping message")
             continue
-        message = json.loads(data)
+        message = loads(data)
         yield message
         await asyncio.sleep(0)
 
 class WebsocketUserConnection(AbstractUserConnection):
 
-    def __init__(self, ws: AsyncWebSocketSession, start_args: WebsocketUserSessionArgs):
+    def __init__(self, ws: AsyncWebSocketSession, start_args: WebsocketUserSessionArgs, codec: Codec | None = None):
         self.ws = ws
         self.start_args = start_args
+        self.codec = codec if codec is not None else default_codec()
+        self.frames = FrameLog(LOGGER_USER, start_args.request_id, interval=settings.log_summary_interval)
 
-    async def send(self, data: dict):
+    async def send(self, data: dict | EncodedMessage):
         "Send a message to a user"
-        await self.ws.send_json(data)
-        LOGGER_USER.info("Message sent")
+        if isinstance(data, EncodedMessage):
+            await self.ws.send_text(data.text)
+        else:
+            await self.ws.send_text(self.codec.dumps(data))
+        self.frames.sent()
 
     async def listen(self):
         "Listen messages from the user"
         try:
-            async for msg in _listen_messages(self.ws):
-                LOGGER_USER.info("Message received")
+            async for msg in _listen_messages(self.ws, received=metrics.bytes_in, loads=self.codec.loads):
+                self.frames.received()
                 yield Message(
                     url=self.start_args.user_url,
                     request_id=self.start_args.request_id,
@@ -80,9 +91,21 @@ class WebsocketUserConnection(AbstractUserConnection):
             raise
 
 class WebsocketClient(AbstractClient):
-
-    def __init__(self, client: AsyncClient | None = None):
+    """Client connecting the app and the users over websockets
+
+    Args:
+        client (httpx.AsyncClient, optional): HTTP client.
+        codec (str or Codec, optional):
+            JSON codec of the frames: ``json``, ``orjson``,
+            ``msgspec`` or ``auto``. Used for decoding
+            the received frames and encoding the
+            messages the sessions send. By default
+            ``settings.json_codec``.
+    """
+
+    def __init__(self, client: AsyncClient | None = None, codec: CodecName | Codec | None = None):
         self.client = client or AsyncClient(timeout=settings.timeout)
+        self.codec = create_codec(codec)
 
     @asynccontextmanager
     async def connect_user(self, start_args: WebsocketUserSessionArgs):
@@ -92,8 +115,11 @@ class WebsocketClient(AbstractClient):
             keepalive_ping_interval_seconds=settings.keepalive_ping_interval,
             keepalive_ping_timeout_seconds=settings.keepalive_ping_timeout
         ) as ws:
-            yield WebsocketUserConnection(ws, start_args)
-            ...
+            conn = WebsocketUserConnection(ws, start_args, codec=self.codec)
+            try:
+                yield conn
+            finally:
+                conn.frames.close()
         ...
 
     async def listen_app(self, conf: ClientConf, setup_start: Callable[[ServerConf, ...], Any]):
@@ -128,7 +154,7 @@ class WebsocketClient(AbstractClient):
                     recovery_key = recovery_conf.recovery_key
                     LOGGER_APP.info("App connected")
                     n_fails = 0
-                    async for msg in _listen_messages(ws):
+                    async for msg in _listen_messages(ws, loads=self.codec.loads):
                         LOGGER_APP.info("User joined")
                         yield WebsocketUserSessionArgs(**msg)
             except (WebSocketNetworkError, WebSocketDisconnect, ExceptionGroup, WebSocketUpgradeError) as exc:
@@ -182,6 +208,7 @@ class WebsocketClient(AbstractClient):
                     msg + f"Reconnecting in {reconnect_delay}..."
                 )
                 await asyncio.sleep(reconnect_delay)
+                metrics.reconnects.inc()
             except WebSocketDisconnect as exc:
                 if exc.code in (1001, 1000):
                     # Normal closure
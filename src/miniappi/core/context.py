@@ -1,17 +1,21 @@
 from copy import copy
-from typing import TYPE_CHECKING, Any, Dict, Union
+from typing import TYPE_CHECKING, Any, Dict, Tuple, Union
 from dataclasses import dataclass, field
 from miniappi.core.models.context import ContextModel
 
 if TYPE_CHECKING:
     from .models.content import BaseContent
     from . import App, Session
+    from .registry import SessionRegistry
 
 
 @dataclass
 class CurrentContent:
-    root: Union["BaseContent", None] = None
-    references: Dict[str, "BaseContent"] = field(default_factory=lambda: {})
+    "Content a user currently has"
+    root: Union[dict, "BaseContent", None] = None
+    references: Dict[str, Any] = field(default_factory=lambda: {})
+    # Limit and method of array references
+    limits: Dict[str, Tuple[int, str]] = field(default_factory=lambda: {})
 
 class UserContext(ContextModel):
 
@@ -28,6 +32,7 @@ class AppContext(ContextModel):
     app_name: str
     app_url: str
     sessions: Dict[str, "Session"]
+    registry: "SessionRegistry"
     extra: dict = field(default_factory=lambda: {})
 
     def copy(self):
@@ -0,0 +1,65 @@
+from typing import Any, Dict, List, Set
+from .models.content import BaseMessage
+from .models.message_types import PutRef, DelRef
+
+def _is_content(value: Any) -> bool:
+    return isinstance(value, dict) and "id" in value and "contentType" in value
+
+def _is_reference(value: Any) -> bool:
+    return isinstance(value, dict) and "reference" in value and "type" in value
+
+def _diff_value(old: Any, new: Any, ops: List[BaseMessage]) -> bool:
+    "Add messages turning old value to new (False if only the container can change it)"
+    if _is_reference(new) and _is_reference(old):
+        # Reference created again (ie. same ID with
+        # other data) must be put with its container
+        return new == old
+    if _is_content(new) and _is_content(old):
+        return _diff_content(old, new, ops)
+    if isinstance(new, list) and isinstance(old, list) and len(new) == len(old):
+        return all(_diff_value(o, n, ops) for o, n in zip(old, new))
+    return old == new
+
+def _diff_content(old: dict, new: dict, ops: List[BaseMessage]) -> bool:
+    "Add messages turning old content to new (False if it must be replaced by its parent)"
+    if old["id"] != new["id"] or old["contentType"] != new["contentType"]:
+        return False
+    if old.keys() == new.keys():
+        child_ops = []
+        if all(_diff_value(old[key], value, child_ops) for key, value in new.items()):
+            ops.extend(child_ops)
+            return True
+    # Own fields changed
+    ops.append(PutRef(id=new["id"], data=new))
+    return True
+
+def _find_references(value: Any, found: Set[str]):
+    if isinstance(value, dict):
+        if _is_reference(value):
+            found.add(value["reference"])
+        for item in value.values():
+            _find_references(item, found)
+    elif isinstance(value, list):
+        for item in value:
+            _find_references(item, found)
+
+def diff_content(old: Dict[str, Any], new: Dict[str, Any]) -> List[BaseMessage] | None:
+    """Get messages turning a sent content tree to a new one
+
+    Content is matched by ``id``. Changed content
+    is replaced with ``PutRef`` and references
+    no longer in the tree are deleted with ``DelRef``.
+    References are compared with their data and
+    content containing a changed reference is put
+    again.
+
+    Returns None if the root itself changed."""
+    ops: List[BaseMessage] = []
+    if not (_is_content(old) and _is_content(new) and _diff_content(old, new, ops)):
+        return None
+    if ops:
+        old_refs, new_refs = set(), set()
+        _find_references(old, old_refs)
+        _find_references(new, new_refs)
+        ops.extend(DelRef(id=ref) for ref in sorted(old_refs - new_refs))
+    return ops
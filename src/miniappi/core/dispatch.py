@@ -0,0 +1,107 @@
+import asyncio
+from collections import deque
+from collections.abc import Hashable
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Literal
+
+from .connection import Message
+
+type DispatchMode = Literal["sequential", "concurrent", "pool"]
+type MessageHandler = Callable[[Message], Awaitable[Any]]
+
+def message_key(msg: Message) -> Hashable:
+    "Get key of the message for ordering (content ID)"
+    data = msg.data
+    if isinstance(data, dict):
+        key = data.get("id")
+        if isinstance(key, Hashable):
+            return key
+    return None
+
+class SequentialDispatcher:
+    """Handle messages one at a time
+
+    The next message is not read before
+    the previous has been handled."""
+
+    def __init__(self, handle: MessageHandler, task_group: asyncio.TaskGroup | None = None, workers: int | None = None):
+        self.handle = handle
+
+    async def dispatch(self, msg: Message):
+        await self.handle(msg)
+
+    def close(self):
+        ...
+
+class ConcurrentDispatcher(SequentialDispatcher):
+    """Handle messages concurrently
+
+    Messages with the same content ID are
+    handled in order, one at a time, and
+    messages for different content IDs
+    concurrently."""
+
+    def __init__(self, handle: MessageHandler, task_group: asyncio.TaskGroup, workers: int | None = None):
+        self.handle = handle
+        self.task_group = task_group
+        self._lanes: Dict[Hashable, Deque[Message]] = {}
+
+    async def dispatch(self, msg: Message):
+        key = message_key(msg)
+        lane = self._lanes.get(key)
+        if lane is not None:
+            lane.append(msg)
+            return
+        lane = self._lanes[key] = deque([msg])
+        self.task_group.create_task(self._run_lane(key, lane))
+
+    async def _run_lane(self, key: Hashable, lane: Deque[Message]):
+        try:
+            while lane:
+                await self.handle(lane[0])
+                lane.popleft()
+        finally:
+            del self._lanes[key]
+
+class PoolDispatcher(SequentialDispatcher):
+    """Handle messages with a fixed number of workers
+
+    Messages with the same content ID go to
+    the same worker thus they are handled in
+    order."""
+
+    def __init__(self, handle: MessageHandler, task_group: asyncio.TaskGroup, workers: int):
+        self.handle = handle
+        self.task_group = task_group
+        self.n_workers = workers
+        self._queues: List[asyncio.Queue[Message | None]] = []
+
+    def _start(self):
+        for _ in range(self.n_workers):
+            queue = asyncio.Queue()
+            self._queues.append(queue)
+            self.task_group.create_task(self._run_worker(queue))
+
+    async def dispatch(self, msg: Message):
+        if not self._queues:
+            self._start()
+        key = message_key(msg)
+        queue = self._queues[hash(key) % self.n_workers]
+        await queue.put(msg)
+
+    async def _run_worker(self, queue: asyncio.Queue[Message | None]):
+        while True:
+            msg = await queue.get()
+            if msg is None:
+                return
+            await self.handle(msg)
+
+    def close(self):
+        "Stop the workers after the queued messages"
+        for queue in self._queues:
+            queue.put_nowait(None)
+
+DISPATCHERS = {
+    "sequential": SequentialDispatcher,
+    "concurrent": ConcurrentDispatcher,
+    "pool": PoolDispatcher,
+}
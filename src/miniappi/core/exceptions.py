@@ -17,3 +17,6 @@ class UserLeftException(StreamException):
 
 class CloseStreamException(StreamException):
     ...
+
+class SendQueueFullException(StreamException):
+    ...
@@ -0,0 +1,101 @@
+import pickle
+import asyncio
+import logging
+import functools
+import multiprocessing
+from contextlib import ExitStack
+from contextvars import Context as VarContext, copy_context
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Dict, List, Literal, Tuple
+
+from miniappi.config import settings
+from .models.context import CONTEXTS, Context
+
+LOGGER = logging.getLogger(__name__)
+
+type ExecutorKind = Literal["thread", "process"]
+
+def create_executor(kind: ExecutorKind) -> Executor:
+    "Create pool for running sync callbacks"
+    if kind == "thread":
+        return ThreadPoolExecutor(
+            max_workers=settings.thread_pool_size,
+            thread_name_prefix="miniappi",
+        )
+    if kind == "process":
+        return ProcessPoolExecutor(
+            max_workers=settings.process_pool_size,
+            mp_context=multiprocessing.get_context(settings.process_pool_start_method),
+        )
+    raise ValueError(f"Invalid executor: {kind!r}")
+
+def check_executor(func: Callable, executor: ExecutorKind | None):
+    "Check the callback can be run with the executor"
+    if executor is None:
+        return
+    if executor not in ("thread", "process"):
+        raise ValueError(f"Invalid executor: {executor!r}")
+    if asyncio.iscoroutinefunction(func):
+        raise TypeError(f"Callback {func.__qualname__!r} run in {executor} pool must be sync")
+
+type ContextSnapshot = List[Tuple[str, Dict[str, bytes]]]
+
+def snapshot_contexts() -> ContextSnapshot:
+    """Get pickled values of the active
+    context models
+
+    Each value is pickled once and values
+    that cannot be pickled (ie. sessions)
+    are left out."""
+    snapshot = []
+    for name, ctx in list(CONTEXTS.items()):
+        if not ctx.exists():
+            continue
+        data = {}
+        for key, value in ctx.data.items():
+            try:
+                data[key] = pickle.dumps(value)
+            except Exception:
+                continue
+        snapshot.append((name, data))
+    return snapshot
+
+def run_with_contexts(snapshot: ContextSnapshot, func: Callable, *args):
+    "Run function with the context values (in a worker process)"
+    # Forked workers may have the contexts
+    # of the parent set
+    return VarContext().run(_run_with_contexts, snapshot, func, *args)
+
+def _run_with_contexts(snapshot: ContextSnapshot, func: Callable, *args):
+    with ExitStack() as stack:
+        for name, data in snapshot:
+            ctx = CONTEXTS.get(name)
+            if ctx is None:
+                LOGGER.warning(f"Context {name!r} not found in the process")
+                continue
+            # Not validated as some values
+            # could not be passed
+            values = {key: pickle.loads(value) for key, value in data.items()}
+            stack.enter_context(Context.enter(ctx, values))
+        return func(*args)
+
+async def run_in_executor(kind: ExecutorKind, func: Callable, *args):
+    """Run sync function in the app's pool
+
+    The context (ie. ``user_context`` and
+    ``app_context``) is available in the
+    function. In threads the context is the
+    same as in the caller. In processes the
+    function gets a copy of the picklable
+    context values and changes are not
+    passed back."""
+    from .context import app_context
+    executor = app_context.app.get_executor(kind)
+    loop = asyncio.get_running_loop()
+    if kind == "thread":
+        ctx = copy_context()
+        return await loop.run_in_executor(executor, functools.partial(ctx.run, func, *args))
+    return await loop.run_in_executor(
+        executor,
+        functools.partial(run_with_contexts, snapshot_contexts(), func, *args)
+    )
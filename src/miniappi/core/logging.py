@@ -1,3 +1,4 @@
+import time
 import logging
 from enum import StrEnum
 
@@ -5,3 +6,80 @@ class Loggers(StrEnum):
     user_connection = "miniappi.core.connection.user"
     app_connection = "miniappi.core.connection.app"
     connection = "miniappi.core.connection"
+
+class FrameLog:
+    """Frame counters of a user connection
+
+    Frames are logged one by one only on DEBUG
+    level. On INFO level, the counts are logged
+    at most once per interval and when the
+    connection ends.
+
+    Args:
+        logger (logging.Logger):
+            Logger to log to.
+        request_id (str):
+            Request ID of the session.
+        interval (float, optional):
+            Seconds between the summaries.
+            None logs only when the connection ends.
+    """
+
+    __slots__ = ("logger", "request_id", "interval", "n_sent", "n_received", "_last_sent", "_last_received", "_last_time")
+
+    def __init__(self, logger: logging.Logger, request_id: str, interval: float | None = None):
+        self.logger = logger
+        self.request_id = request_id
+        self.interval = interval
+        self.n_sent = 0
+        self.n_received = 0
+        self._last_sent = 0
+        self._last_received = 0
+        self._last_time = time.monotonic()
+
+    def sent(self):
+        self.n_sent += 1
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Message sent", extra={"request_id": self.request_id})
+        if self.interval is not None:
+            self._check_interval()
+
+    def received(self):
+        self.n_received += 1
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Message received", extra={"request_id": self.request_id})
+        if self.interval is not None:
+            self._check_interval()
+
+    def _check_interval(self):
+        now = time.monotonic()
+        if now - self._last_time < self.interval:
+            return
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(
+                "Session %s: %d messages sent, %d received in %.0f s",
+                self.request_id,
+                self.n_sent - self._last_sent,
+                self.n_received - self._last_received,
+                now - self._last_time,
+                extra=self._extra(),
+            )
+        self._last_sent = self.n_sent
+        self._last_received = self.n_received
+        self._last_time = now
+
+    def close(self):
+        "Log the totals"
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(
+                "Session %s ended: %d messages sent, %d received",
+                self.request_id, self.n_sent, self.n_received,
+                extra=self._extra(),
+            )
+
+    def _extra(self):
+        return {
+            "request_id": self.request_id,
+            "messages_sent": self.n_sent,
+            "messages_received": self.n_received,
+        }
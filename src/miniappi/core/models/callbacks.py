@@ -1,7 +1,9 @@
-from typing import Any, Awaitable
+import functools
+from typing import Any, Awaitable, Iterable
 from collections.abc import Callable
 from pydantic import BaseModel
 from miniappi.core.connection import Message
+from miniappi.core.executor import ExecutorKind, check_executor, run_in_executor
 
 class StartArgs(BaseModel):
     request_id: str
@@ -11,17 +13,34 @@ class StartArgs(BaseModel):
 
 class OnMessageConfig:
 
-    def __init__(self, func: Callable[[Message], Awaitable[Any]]):
+    def __init__(self, func: Callable[[Message], Awaitable[Any]],
+                 ids: Iterable[str] | None = None,
+                 request_id: str | None = None,
+                 executor: ExecutorKind | None = None):
+        check_executor(func, executor)
         self.func = func
+        self.ids = frozenset(ids) if ids is not None else None
+        self.request_id = request_id
+        self.executor = executor
+        self.order = 0
 
     async def __call__(self, msg: Message):
+        if self.executor is not None:
+            return await run_in_executor(self.executor, self.func, msg)
         return await self.func(msg)
 
 class OnOpenConfig:
 
-    def __init__(self, func: Callable[[Message], Awaitable[Any]], pass_session):
+    def __init__(self, func: Callable[[Message], Awaitable[Any]], pass_session,
+                 executor: ExecutorKind | None = None):
+        check_executor(func, executor)
+        if executor == "process" and pass_session:
+            raise TypeError("Session cannot be passed to a process")
         self.func = func
         self.pass_session = pass_session
+        self.executor = executor
 
     async def __call__(self, *args, **kwargs):
+        if self.executor is not None:
+            return await run_in_executor(self.executor, functools.partial(self.func, **kwargs), *args)
         return await self.func(*args, **kwargs)
@@ -2,7 +2,7 @@ from typing import Union, TYPE_CHECKING, Generator
 from uuid import uuid4
 from contextlib import contextmanager
 from pydantic import BaseModel
-from ..context import user_context, app_context
+from ..context import user_context
 
 if TYPE_CHECKING:
     from ..app.stream import AppSession
@@ -24,8 +24,8 @@ class BaseContent(BaseModel):
         except LookupError:
             # Called outside of channel
             # --> set as root to all channels
-            for session in app_context.sessions.values():
-                await session.send(self)
+            from miniappi.core.broadcast import broadcast
+            return await broadcast(self)
 
     async def wait_input(self, show=True, *args, **kwargs):
         from miniappi.flow.interact import wait_for_input
@@ -1,14 +1,37 @@
 import inspect
 import dataclasses
-from uuid import uuid4
+from copy import copy
+from weakref import WeakValueDictionary
 from typing import Any, Optional, Generic, TypeVar, Dict
-from contextvars import copy_context
 from collections import UserDict
-from contextlib import contextmanager
 from contextvars import ContextVar, Token
 
 ContextDataT = TypeVar("ContextDataT")
 
+# Default of the context variables to check
+# existence without copying the context
+_UNSET = object()
+
+class ContextEntry(Generic[ContextDataT]):
+    "Context manager to set a context"
+
+    __slots__ = ("context", "data", "token")
+
+    def __init__(self, context: "Context[ContextDataT]", data: ContextDataT):
+        self.context = context
+        self.data = data
+        self.token: Token | None = None
+
+    def __enter__(self) -> ContextVar[ContextDataT]:
+        store = self.context.store
+        if store.get(_UNSET) is not _UNSET:
+            raise LookupError("Context already initiated")
+        self.token = store.set(self.data)
+        return store
+
+    def __exit__(self, exc_type, exc, tb):
+        self.context.store.reset(self.token)
+
 class Context(Generic[ContextDataT]):
 
     def __init__(self, name: str):
@@ -21,17 +44,11 @@ class Context(Generic[ContextDataT]):
         return self.store.get()
 
     def exists(self) -> bool:
-        return self.store in copy_context()
+        return self.store.get(_UNSET) is not _UNSET
 
-    @contextmanager
-    def enter(self, data: ContextDataT):
+    def enter(self, data: ContextDataT) -> ContextEntry[ContextDataT]:
         "Enter context"
-        if self.exists():
-            raise LookupError("Context already initiated")
-
-        token: Token = self.store.set(data)
-        yield self.store
-        self.store.reset(token)
+        return ContextEntry(self, data)
 
     def __repr__(self) -> str:
         try:
@@ -54,84 +71,132 @@ class ContextDict(Context[Dict[Any, Any]], UserDict):
 
 MISSING = dataclasses.MISSING
 
+# Context models by name so that a context can
+# be found in another process (see executors)
+CONTEXTS: "WeakValueDictionary[str, ContextModel]" = WeakValueDictionary()
+
+class ContextField:
+    """Accessor of a context model field
+
+    Reads and writes the value in the
+    current context."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __get__(self, obj: "ContextModel | None", objtype=None):
+        if obj is None:
+            return self
+        return obj.store.get()[self.name]
+
+    def __set__(self, obj: "ContextModel", value):
+        obj.store.get()[self.name] = value
+
+def _create_field(name: str, type_, default) -> dataclasses.Field:
+    if isinstance(default, dataclasses.Field):
+        field = copy(default)
+    else:
+        field = dataclasses.field()
+        field.default = default
+    field.name = name
+    field.type = type_
+    return field
+
+def _module_name(cls: type) -> str:
+    # The main module is imported as __mp_main__
+    # in spawned worker processes
+    module = cls.__module__
+    return "__main__" if module == "__mp_main__" else module
+
 class ContextModel(Context[Dict[Any, Any]]):
     __ignore_extra__: bool = False
+    # Fields of the class (including the
+    # fields of the base classes)
+    __class_fields__: Dict[str, dataclasses.Field] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = {}
+        for base in reversed(cls.__bases__):
+            fields.update(getattr(base, "__class_fields__", {}))
+        for name, type_ in inspect.get_annotations(cls).items():
+            if name.startswith("__"):
+                continue
+            fields[name] = _create_field(name, type_, cls.__dict__.get(name, MISSING))
+            setattr(cls, name, ContextField(name))
+        cls.__class_fields__ = fields
 
     def __init__(self, name_: str | None = None, **kwargs):
         if name_ is None:
-            name_ = str(uuid4())
+            # Same in all processes as long as
+            # the contexts are created in same order
+            name_ = base = f"{_module_name(type(self))}.{type(self).__qualname__}"
+            n = 1
+            while name_ in CONTEXTS:
+                n += 1
+                name_ = f"{base}-{n}"
         self.store: ContextVar[ContextDataT] = ContextVar(
             name_
         )
+        CONTEXTS[name_] = self
         self._set_attrs(**kwargs)
 
     def _set_attrs(self, **kwargs):
-        attrs = inspect.get_annotations(type(self))
-        fields: Dict[str, dataclasses.Field] = {}
-        for name, type_ in attrs.items():
-            try:
-                default = super().__getattribute__(name)
-            except AttributeError:
-                default = MISSING
-            if isinstance(default, dataclasses.Field):
-                fields[name] = default
-            else:
-                field = dataclasses.field()
-                field.name = name
-                field.default = default
-                field.type = type_
-                fields[name] = field
-            if name in kwargs:
-                field.default = kwargs[name]
+        fields = self.__class_fields__
+        if kwargs:
+            # Defaults of this instance
+            fields = fields.copy()
+            for name, value in kwargs.items():
+                if name not in fields:
+                    self._raise_attr_error(name)
+                field = fields[name] = copy(fields[name])
+                field.default = value
+                field.default_factory = MISSING
         self.__fields__ = fields
+        self._defaults = {
+            name: field.default
+            for name, field in fields.items()
+            if field.default is not MISSING
+        }
+        self._default_factories = {
+            name: field.default_factory
+            for name, field in fields.items()
+            if field.default is MISSING and field.default_factory is not MISSING
+        }
 
     def enter(self, data: Optional[Dict] = None):
-        defaults = {
-            name: field.default if field.default is not MISSING else field.default_factory()
-            for name, field in self.__fields__.items()
-            if (
-                field.default is not MISSING
-                or field.default_factory is not MISSING
-            )
-        }
+        fields = self.__fields__
         if data is None:
             data = {}
-        elif not self.__ignore_extra__:
+        elif not self.__ignore_extra__ and not data.keys() <= fields.keys():
             extra_fields = [
                 field
                 for field in data
-                if field not in self.__fields__
+                if field not in fields
+            ]
+            raise TypeError(f"'{type(self)}' has no attribute(s): {', '.join(extra_fields)}")
+        values = self._defaults.copy()
+        for name, factory in self._default_factories.items():
+            if name not in data:
+                values[name] = factory()
+        values.update(data)
+
+        if not fields.keys() <= values.keys():
+            missing_fields = [
+                field_name
+                for field_name in fields
+                if field_name not in values
             ]
-            if extra_fields:
-                raise TypeError(f"'{type(self)}' has no attribute(s): {', '.join(extra_fields)}")
-        data = {**defaults, **data}
-
-        missing_fields = [
-            field_name
-            for field_name in self.__fields__
-            if field_name not in data
-        ]
-        if missing_fields:
             raise TypeError(f'Missing required argument(s): {", ".join(missing_fields)}')
-        return super().enter(data)
-
-    def __getattribute__(self, key: str):
-        try:
-            fields = super().__getattribute__("__fields__")
-        except AttributeError:
-            return super().__getattribute__(key)
-
-        if key in fields:
-            value = self.data[key]
-            return value
-        return super().__getattribute__(key)
+        return super().enter(values)
 
     def __setattr__(self, name: str, value):
-        if name in ("store",) or name.startswith("_"):
-            return super().__setattr__(name, value)
-        if name not in self.__fields__:
-            self._raise_attr_error(name)
-        self.data[name] = value
+        if name in self.__class_fields__ or name == "store" or name.startswith("_"):
+            # Fields are set by their accessors
+            return object.__setattr__(self, name, value)
+        self._raise_attr_error(name)
 
     def _raise_attr_error(self, name: str):
         raise AttributeError(f"'{type(self)!s}' object has no attribute '{name}'")
@@ -0,0 +1,30 @@
+"""Messages not in the generated protocol schema
+
+These are written by hand (unlike ``message_types``)
+and the client must support them: batch frames
+and the ``extend`` method of array references.
+"""
+from typing import Any, List, Literal
+
+from pydantic import ConfigDict
+from miniappi.core.models.content import BaseMessage
+
+class Batch(BaseMessage):
+    "Multiple messages applied in order"
+
+    model_config = ConfigDict(
+        extra='allow',
+    )
+    data: List[Any]
+    type: Literal['batch'] = 'batch'
+
+class ExtendRight(BaseMessage):
+    "Push multiple items to the end"
+
+    model_config = ConfigDict(
+        extra='allow',
+    )
+    data: List[Any]
+    id: str
+    method: Literal['extend'] = 'extend'
+    type: Literal['ref'] = 'ref'
@@ -0,0 +1,317 @@
+import os
+import json
+import asyncio
+import logging
+import contextvars
+from uuid import uuid4
+from abc import ABC, abstractmethod
+from dataclasses import asdict
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, Set
+
+from miniappi.config import settings
+from miniappi.core.models.callbacks import OnMessageConfig
+from .connection import Message, EncodedMessage
+
+if TYPE_CHECKING:
+    from .app import App
+    from .session import Session
+
+LOGGER = logging.getLogger(__name__)
+
+type InputCallback = Callable[[Message], Awaitable[Any]]
+
+class SessionRegistry:
+    """Sessions of the app
+
+    Keeps the sessions of this process
+    (``sessions``) and passes broadcasts and
+    input to sessions in other processes. This
+    base registry knows only the sessions of
+    this process.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[str, "Session"] = {}
+        self.app: "App | None" = None
+
+    async def start(self, app: "App"):
+        "Start sharing the sessions of the app"
+        self.app = app
+
+    async def close(self):
+        "Stop sharing the sessions"
+        ...
+
+    async def join(self, request_id: str):
+        "Announce a session opened in this process"
+        ...
+
+    async def leave(self, request_id: str):
+        "Announce a session closed in this process"
+        ...
+
+    def request_ids(self) -> Set[str]:
+        "Request IDs of all sessions"
+        return set(self.sessions)
+
+    def __len__(self):
+        return len(self.request_ids())
+
+    async def publish(self, body: EncodedMessage):
+        "Send a message to the sessions in other processes"
+        ...
+
+    @asynccontextmanager
+    async def watch(self, ids: Iterable[str] | None, callback: InputCallback, request_id: str | None = None):
+        "Receive messages to the content from sessions in other processes"
+        yield
+
+class LocalRegistry(SessionRegistry):
+    "Registry of the sessions in this process only"
+
+class BusRegistry(SessionRegistry, ABC):
+    """Registry sharing the sessions over a bus
+
+    Frames are JSON serializable dicts passed
+    through a hub (see ``RegistryHub``) to the
+    registries in other processes."""
+
+    def __init__(self):
+        super().__init__()
+        self.remote: Set[str] = set()
+        self._watches: Dict[str, tuple[InputCallback, contextvars.Context]] = {}
+        self._forwards: Dict[str, OnMessageConfig] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    @abstractmethod
+    def send_frame(self, frame: dict):
+        "Send a frame to the hub"
+        ...
+
+    async def join(self, request_id: str):
+        self.send_frame({"kind": "join", "request_id": request_id})
+
+    async def leave(self, request_id: str):
+        self.send_frame({"kind": "leave", "request_id": request_id})
+
+    def request_ids(self) -> Set[str]:
+        return self.remote | set(self.sessions)
+
+    async def publish(self, body: EncodedMessage):
+        self.send_frame({"kind": "broadcast", "text": body.text})
+
+    @asynccontextmanager
+    async def watch(self, ids: Iterable[str] | None, callback: InputCallback, request_id: str | None = None):
+        watch_id = uuid4().hex
+        # Callback is run in the context of the watcher
+        self._watches[watch_id] = (callback, contextvars.copy_context())
+        self.send_frame({
+            "kind": "watch",
+            "watch_id": watch_id,
+            "ids": list(ids) if ids is not None else None,
+            "request_id": request_id,
+        })
+        try:
+            yield
+        finally:
+            del self._watches[watch_id]
+            self.send_frame({"kind": "unwatch", "watch_id": watch_id})
+
+    def handle_frame(self, frame: dict):
+        "Handle a frame from the hub"
+        match frame["kind"]:
+            case "members":
+                self.remote = set(frame["request_ids"]) - set(self.sessions)
+            case "join":
+                self.remote.add(frame["request_id"])
+            case "leave":
+                self.remote.discard(frame["request_id"])
+            case "broadcast":
+                from .broadcast import broadcast
+                body = EncodedMessage.from_json(frame["text"])
+                # Only to the sessions of this process
+                self._run(broadcast(body, self.sessions.values()))
+            case "watch":
+                self._add_forward(frame)
+            case "unwatch":
+                cb = self._forwards.pop(frame["watch_id"], None)
+                if cb is not None:
+                    self.app.callbacks_message.remove(cb)
+            case "input":
+                watch = self._watches.get(frame["watch_id"])
+                if watch is not None:
+                    callback, context = watch
+                    self._run(callback(Message(**frame["message"])), context=context)
+
+    def _add_forward(self, frame: dict):
+        watch_id = frame["watch_id"]
+
+        async def forward(msg: Message):
+            self.send_frame({"kind": "input", "watch_id": watch_id, "message": asdict(msg)})
+
+        cb = OnMessageConfig(func=forward, ids=frame["ids"], request_id=frame["request_id"])
+        self._forwards[watch_id] = cb
+        self.app.callbacks_message.append(cb)
+
+    def _run(self, coro: Awaitable, context: contextvars.Context | None = None):
+        task = asyncio.create_task(coro, context=context)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        for cb in self._forwards.values():
+            self.app.callbacks_message.remove(cb)
+        self._forwards = {}
+        self.remote = set()
+
+class RegistryHub:
+    """Passes frames between registries
+
+    Peers are objects with method ``send_frame``.
+    The hub keeps track of the sessions and
+    watches of each peer so that new peers get
+    the current state and the state of a
+    disconnected peer is removed."""
+
+    def __init__(self):
+        self.members: Dict[Any, Set[str]] = {}
+        self.watches: Dict[str, tuple[Any, dict]] = {}
+
+    def connect(self, peer):
+        "Add a peer"
+        self.members[peer] = set()
+        peer.send_frame({
+            "kind": "members",
+            "request_ids": [rid for ids in self.members.values() for rid in ids]
+        })
+        for _, frame in self.watches.values():
+            peer.send_frame(frame)
+
+    def disconnect(self, peer):
+        "Remove a peer and its sessions"
+        for request_id in self.members.pop(peer, ()):
+            self._send_others(peer, {"kind": "leave", "request_id": request_id})
+        for watch_id, (owner, _) in list(self.watches.items()):
+            if owner is peer:
+                del self.watches[watch_id]
+                self._send_others(peer, {"kind": "unwatch", "watch_id": watch_id})
+
+    def handle(self, peer, frame: dict):
+        "Pass a frame from a peer"
+        match frame["kind"]:
+            case "join":
+                self.members[peer].add(frame["request_id"])
+            case "leave":
+                self.members[peer].discard(frame["request_id"])
+            case "watch":
+                self.watches[frame["watch_id"]] = (peer, frame)
+            case "unwatch":
+                self.watches.pop(frame["watch_id"], None)
+            case "input":
+                owner = self.watches.get(frame["watch_id"])
+                if owner is not None:
+                    owner[0].send_frame(frame)
+                return
+        self._send_others(peer, frame)
+
+    def _send_others(self, peer, frame: dict):
+        for other in list(self.members):
+            if other is not peer:
+                other.send_frame(frame)
+
+class _StreamPeer:
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    def send_frame(self, frame: dict):
+        if not self.writer.is_closing():
+            self.writer.write(json.dumps(frame).encode() + b"\n")
+
+class UnixSocketRegistry(BusRegistry):
+    """Registry sharing the sessions of app
+    processes on the same host
+
+    The first process binds the socket and
+    acts as the hub for the others. If the hub
+    process stops, the others continue with
+    their own sessions only.
+
+    Args:
+        path (str, optional): Path of the socket.
+            By default ``settings.registry_path``.
+    """
+
+    limit = 2 ** 24
+
+    def __init__(self, path: str | None = None):
+        super().__init__()
+        self.path = path or settings.registry_path
+        self.hub: RegistryHub | None = None
+        self._server: asyncio.Server | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+
+    async def start(self, app: "App"):
+        await super().start(app)
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.path, limit=self.limit)
+        except (FileNotFoundError, ConnectionRefusedError):
+            await self._start_hub()
+            reader, writer = await asyncio.open_unix_connection(self.path, limit=self.limit)
+        self._writer = writer
+        self._reader_task = asyncio.create_task(self._read(reader))
+
+    async def _start_hub(self):
+        if os.path.exists(self.path):
+            # Left from a stopped hub
+            os.unlink(self.path)
+        self.hub = RegistryHub()
+        self._server = await asyncio.start_unix_server(self._serve_peer, self.path, limit=self.limit)
+        LOGGER.info(f"Session registry hub started at {self.path}")
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = _StreamPeer(writer)
+        self.hub.connect(peer)
+        try:
+            while line := await reader.readline():
+                self.hub.handle(peer, json.loads(line))
+        except ConnectionError:
+            ...
+        finally:
+            self.hub.disconnect(peer)
+            writer.close()
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while line := await reader.readline():
+                self.handle_frame(json.loads(line))
+        except ConnectionError:
+            ...
+        if self._writer is not None:
+            LOGGER.warning("Session registry hub disconnected")
+            await BusRegistry.close(self)
+
+    def send_frame(self, frame: dict):
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(json.dumps(frame).encode() + b"\n")
+
+    async def close(self):
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._server is not None:
+            self._server.close()
+            self._server.close_clients()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        await super().close()
+
+def create_registry() -> SessionRegistry:
+    "Create registry from settings"
+    if settings.registry_path:
+        return UnixSocketRegistry(settings.registry_path)
+    return LocalRegistry()
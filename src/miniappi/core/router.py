@@ -0,0 +1,102 @@
+from heapq import merge
+from itertools import count
+from operator import attrgetter
+from collections.abc import Hashable
+from typing import Dict, Iterator, List, Tuple
+
+from miniappi.core.models.callbacks import OnMessageConfig
+from .connection import Message
+from .dispatch import message_key
+
+class MessageRouter:
+    """Message callbacks indexed by content
+    and request ID
+
+    Callbacks without content or request ID
+    receive all messages. Others are looked
+    up by the message's content ID and request
+    ID thus the cost of routing does not grow
+    with the number of callbacks waiting for
+    other content or users.
+    """
+
+    def __init__(self):
+        self._callbacks: Dict[OnMessageConfig, None] = {}
+        self._any: List[OnMessageConfig] = []
+        self._by_id: Dict[Hashable, List[OnMessageConfig]] = {}
+        self._by_request: Dict[str, List[OnMessageConfig]] = {}
+        self._by_id_request: Dict[Tuple[Hashable, str], List[OnMessageConfig]] = {}
+        self._counter = count()
+
+    def _get_buckets(self, cb: OnMessageConfig) -> Iterator[Tuple[dict | None, Hashable]]:
+        if cb.ids is None and cb.request_id is None:
+            yield None, None
+        elif cb.ids is None:
+            yield self._by_request, cb.request_id
+        elif cb.request_id is None:
+            for id in cb.ids:
+                yield self._by_id, id
+        else:
+            for id in cb.ids:
+                yield self._by_id_request, (id, cb.request_id)
+
+    def append(self, cb: OnMessageConfig) -> OnMessageConfig:
+        "Add a callback"
+        cb.order = next(self._counter)
+        self._callbacks[cb] = None
+        for index, key in self._get_buckets(cb):
+            if index is None:
+                self._any.append(cb)
+            else:
+                index.setdefault(key, []).append(cb)
+        return cb
+
+    def remove(self, cb: OnMessageConfig):
+        "Remove a callback"
+        del self._callbacks[cb]
+        for index, key in self._get_buckets(cb):
+            if index is None:
+                self._any.remove(cb)
+            else:
+                bucket = index[key]
+                bucket.remove(cb)
+                if not bucket:
+                    del index[key]
+
+    def match(self, msg: Message) -> Tuple[OnMessageConfig, ...]:
+        """Get callbacks for the message in the order they were added
+
+        Returns a copy so callbacks can be added
+        or removed while running the matched ones."""
+        buckets = [self._any] if self._any else []
+        key = message_key(msg)
+        if self._by_id and key is not None:
+            bucket = self._by_id.get(key)
+            if bucket:
+                buckets.append(bucket)
+        if self._by_request and msg.request_id is not None:
+            bucket = self._by_request.get(msg.request_id)
+            if bucket:
+                buckets.append(bucket)
+        if self._by_id_request and key is not None:
+            bucket = self._by_id_request.get((key, msg.request_id))
+            if bucket:
+                buckets.append(bucket)
+
+        if not buckets:
+            return ()
+        if len(buckets) == 1:
+            return tuple(buckets[0])
+        return tuple(merge(*buckets, key=attrgetter("order")))
+
+    def __iter__(self):
+        return iter(list(self._callbacks))
+
+    def __len__(self):
+        return len(self._callbacks)
+
+    def __getitem__(self, index: int):
+        if index == -1 and self._callbacks:
+            # Last added without copying all
+            return next(reversed(self._callbacks))
+        return list(self._callbacks)[index]
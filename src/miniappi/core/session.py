@@ -1,30 +1,144 @@
+import json
+import time
 import asyncio
 import logging
-from typing import List, Dict, Awaitable, Any, Callable
+from contextvars import ContextVar
+from typing import List, Dict, Awaitable, Any, Callable, Iterable
 from collections.abc import Callable
 from contextlib import asynccontextmanager, AsyncExitStack
 from pydantic import BaseModel
-from .exceptions import UserLeftException
-from .connection import AbstractUserConnection, Message
+from miniappi.config import settings
+from miniappi import metrics
+from .exceptions import UserLeftException, SendQueueFullException
+from .connection import AbstractUserConnection, Message, EncodedMessage
 from .connection import UserSessionArgs
+from .connection.codec import Codec, default_codec
 from .models.message_types import InputMessage, PutRoot, BaseMessage
+from .models.extensions import Batch
 from .models.content import BaseContent
+from .utils.coalesce import coalesce
+from .dispatch import DISPATCHERS, DispatchMode
+from .router import MessageRouter
+from .dispatch import message_key
+from .tracing import Tracer
+from .diff import diff_content
+from .context import CurrentContent
+from .utils.message import apply_message, snapshot
 
-type RequestStreams = List[Callable[[dict], Awaitable[Any]]]
+type RequestStreams = MessageRouter
+
+# Put to the outbound queue to make the writer close the session
+_DISCONNECT = object()
+
+def format_message(data: dict | BaseModel | EncodedMessage) -> dict:
+    "Format content or a message to a sendable dict"
+    if isinstance(data, EncodedMessage):
+        return data.data
+    if isinstance(data, BaseContent):
+        # Considering as put message
+        data = PutRoot(
+            data=data
+        )
+    if isinstance(data, dict):
+        data = InputMessage(**data)
+    if not isinstance(data, BaseMessage):
+        raise TypeError(f"Expected: {BaseMessage!r}, given: {type(data)!r}")
+
+    # The data is validated when created. References
+    # with own storage (like Feed's ring buffer) are
+    # serialized by their own schema which the
+    # generated models would warn about
+    return data.model_dump(exclude_none=True, warnings=False)
+
+def encode_message(data: dict | BaseModel | EncodedMessage, codec: Codec | None = None) -> EncodedMessage:
+    "Format content or a message to a sendable body"
+    if isinstance(data, EncodedMessage):
+        # Already encoded
+        return data
+    return EncodedMessage.encode(format_message(data), codec=codec)
+
+def encode_batch(messages: Iterable[dict | BaseModel | EncodedMessage], codec: Codec | None = None) -> EncodedMessage:
+    "Format multiple messages to one sendable body"
+    return EncodedMessage.encode(
+        Batch(
+            data=[format_message(msg) for msg in messages]
+        ).model_dump(exclude_none=True),
+        codec=codec
+    )
+
+class _Transaction(list):
+    "Messages collected in a transaction"
+    closed = False
+
+def _is_root_put(data) -> bool:
+    return isinstance(data, dict) and data.get("type") == "root" and data.get("method") == "put"
+
+def _callback_name(cb) -> str:
+    func = getattr(cb, "func", cb)
+    return getattr(func, "__qualname__", repr(func))
 
 class Session:
+    """User session
+
+    If ``settings.send_queue_size`` is set,
+    the sent messages are put to an outbound
+    queue which is written to the user by
+    a separate writer task. If the queue
+    is full, the ``settings.send_queue_policy``
+    determines whether the sender waits
+    ('block'), the oldest message is discarded
+    ('drop-oldest') or the session is closed
+    ('disconnect').
+
+    If ``settings.send_coalesce_window`` is set,
+    the writer waits the given seconds after
+    a message to collect more messages and
+    merges them (ie. consecutive pushes to
+    a feed) before writing.
+
+    If ``settings.content_diff`` is set, shown
+    content is compared to the content sent
+    previously and only the changed parts are
+    sent (see ``miniappi.core.diff``).
+
+    If ``settings.content_mirror`` is set, the
+    content the user has is kept in ``content``,
+    puts of what the user already has are not
+    sent and ``resync`` sends the content again.
+
+    Args:
+        dispatch ('sequential', 'concurrent', 'pool', optional):
+            How received messages are passed to
+            the message callbacks. Sequential handles
+            one message at a time, concurrent handles
+            messages of different content concurrently
+            and pool uses fixed number of workers.
+            Messages of the same content are always
+            handled in order. By default from settings.
+        tracer (Tracer, optional):
+            Tracer for the spans of the session. By
+            default no tracing.
+    """
 
     callbacks_message: RequestStreams
     tasks: List[asyncio.Task]
+    outbound: asyncio.Queue[EncodedMessage] | None
 
     def __init__(self, start_conn: AbstractUserConnection,
                  start_args: UserSessionArgs,
                  callbacks_message: RequestStreams,
-                 sessions: Dict[str, "Session"]):
+                 sessions: Dict[str, "Session"],
+                 dispatch: DispatchMode | None = None,
+                 tracer: Tracer | None = None):
         self.start_conn = start_conn
         self.start_args = start_args
+        # Outbound messages are encoded as the connection decides
+        self.codec = start_conn.codec if start_conn.codec is not None else default_codec()
+        self.tracer = tracer if tracer is not None else Tracer()
 
         self.callbacks_message = callbacks_message
+        self.dispatch = settings.message_dispatch if dispatch is None else dispatch
+        self._dispatch_message = self._run_callbacks
 
         self._sessions = sessions
         self._sessions[start_args.request_id] = self
@@ -32,64 +146,338 @@ class Session:
         self.tasks = []
 
         self.is_running = False
+        self.is_closed = False
+
+        self.coalesce_window = settings.send_coalesce_window
+        self.outbound = (
+            asyncio.Queue(maxsize=settings.send_queue_size or 0)
+            if settings.send_queue_size is not None or self.coalesce_window is not None
+            else None
+        )
+        self.send_queue_policy = settings.send_queue_policy
+        self.queue_depth_max = 0
+        self.n_dropped = 0
+        self._writer: asyncio.Task | None = None
+        # Set only in the task running the transaction
+        self._transaction: ContextVar[_Transaction | None] = ContextVar(
+            f"transaction-{start_args.request_id}", default=None
+        )
+
+        self.content_diff = settings.content_diff
+        # What the user currently has (if mirrored)
+        self.content: CurrentContent | None = CurrentContent() if settings.content_mirror else None
+        self._root_text: str | None = None
+        # False if the user may have missed messages
+        self._in_sync = True
+        # Content tree last put to the root
+        self._last_root: dict | None = None
 
     @property
     def request_id(self):
         return self.start_args.request_id
 
-    async def send(self, data: dict | BaseModel):
-        "Send to the response channel"
+    @property
+    def queue_depth(self) -> int:
+        "Number of messages waiting in the outbound queue"
+        return self.outbound.qsize() if self.outbound is not None else 0
+
+    async def send(self, data: dict | BaseModel | EncodedMessage):
+        """Send to the response channel
 
-        logger = self.get_logger()
-        logger.info("Sending data")
+        Pass an encoded message to avoid formatting
+        the same message again for each session."""
+        transaction = self._transaction.get()
+        if transaction is not None and not transaction.closed:
+            transaction.append(data)
+            return
         body = self._format_send_message(data)
+        if self.content is not None:
+            if self._is_redundant(body):
+                return
+            self._mirror(body)
+        if self.content_diff:
+            body = self._diff_root(body)
+            if body is None:
+                # Nothing changed
+                return
+        await self._send_body(body)
 
-        await self.start_conn.send(body)
+    async def _send_body(self, body: EncodedMessage):
+        if self.outbound is None:
+            await self._write(body)
+        else:
+            await self._enqueue(body)
+
+    async def resync(self):
+        """Send the content the user should have
+        as one message (ie. after reconnecting)
+
+        Requires ``settings.content_mirror``."""
+        if self.content is None:
+            raise RuntimeError("Content is not mirrored (see settings.content_mirror)")
+        if self.content.root is None:
+            return
+        self._root_text = None
+        self._in_sync = True
+        await self._send_body(
+            encode_message(PutRoot(data=snapshot(self.content)), codec=self.codec)
+        )
 
-    def _format_send_message(self, data):
-        if isinstance(data, BaseContent):
-            # Considering as put message
-            data = PutRoot(
-                data=data
-            )
-        if isinstance(data, dict):
-            data = InputMessage(**data)
-        if not isinstance(data, BaseMessage):
-            raise TypeError(f"Expected: {BaseMessage!r}, given: {type(data)!r}")
-        
-        return data.model_dump(exclude_none=True)
+    async def send_many(self, messages: Iterable[dict | BaseModel | EncodedMessage]):
+        "Send multiple messages as one frame"
+        messages = list(messages)
+        if len(messages) == 1:
+            await self.send(messages[0])
+        elif messages:
+            await self.send(encode_batch(messages, codec=self.codec))
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Collect the messages sent in the block
+        and send them as one frame at the end
+
+        Messages are discarded if the block fails.
+        Only the messages sent by the current task
+        (or tasks it creates in the block) are
+        collected.
+
+        Examples
+        --------
+        ```python
+        async with session.transaction():
+            await feed.append("a value")
+            await title.show()
+        ```
+        """
+        current = self._transaction.get()
+        if current is not None and not current.closed:
+            # Already in a transaction
+            yield
+            return
+        transaction = _Transaction()
+        token = self._transaction.set(transaction)
+        try:
+            yield
+        finally:
+            # Tasks created in the block may
+            # still have it in their context
+            transaction.closed = True
+            self._transaction.reset(token)
+        await self.send_many(transaction)
+
+    async def _enqueue(self, body: EncodedMessage):
+        queue = self.outbound
+        if self.is_closed:
+            self._count_dropped()
+            return
+        if queue.full():
+            if self.send_queue_policy == "drop-oldest":
+                queue.get_nowait()
+                queue.task_done()
+                self._count_dropped()
+                # The user may lack changes the
+                # next diff would be based on
+                self._last_root = None
+                self._in_sync = False
+            elif self.send_queue_policy == "disconnect":
+                self.get_logger().warning("Outbound queue full, disconnecting")
+                self._clear_queue()
+                self._count_dropped()
+                queue.put_nowait(_DISCONNECT)
+                return
+        await queue.put(body)
+        if self.is_closed:
+            # Closed while waiting for space,
+            # the writer is gone
+            self._clear_queue()
+            return
+        depth = queue.qsize()
+        self.queue_depth_max = max(self.queue_depth_max, depth)
+        metrics.send_queue_depth.observe(depth)
+
+    def _count_dropped(self):
+        self.n_dropped += 1
+        metrics.messages_dropped.inc()
+
+    def _clear_queue(self):
+        queue = self.outbound
+        while not queue.empty():
+            queue.get_nowait()
+            queue.task_done()
+            self._count_dropped()
+
+    def start_writer(self, task_group: asyncio.TaskGroup):
+        "Start writing the outbound queue (if used)"
+        if self.outbound is not None:
+            self._writer = task_group.create_task(self.write())
+            self.tasks.append(self._writer)
+
+    async def write(self):
+        "Write the outbound queue to the response channel"
+        queue = self.outbound
+        while True:
+            bodies = [await queue.get()]
+            try:
+                if self.coalesce_window is not None:
+                    await asyncio.sleep(self.coalesce_window)
+                    while not queue.empty():
+                        bodies.append(queue.get_nowait())
+                if any(body is _DISCONNECT for body in bodies):
+                    raise SendQueueFullException("Outbound queue full")
+                for body in coalesce(bodies, codec=self.codec) if len(bodies) > 1 else bodies:
+                    await self._write(body)
+            finally:
+                for _ in range(len(bodies)):
+                    queue.task_done()
+
+    async def flush(self):
+        "Wait till the outbound queue is written"
+        if self.outbound is not None and self._writer is not None:
+            await self.outbound.join()
+
+    def _is_redundant(self, body: EncodedMessage) -> bool:
+        "Check if the user already has what is put"
+        data = body.data
+        if not self._in_sync or not isinstance(data, dict):
+            return False
+        if _is_root_put(data):
+            return body.text == self._root_text
+        if data.get("type") == "ref" and data.get("method") == "put":
+            references = self.content.references
+            return data["id"] in references and references[data["id"]] == data["data"]
+        return False
+
+    def _mirror(self, body: EncodedMessage):
+        if not isinstance(body.data, dict):
+            return
+        try:
+            apply_message(self.content, body.data)
+        except (KeyError, IndexError, TypeError, ValueError):
+            # Mirror cannot follow, resync puts it right
+            self.get_logger().debug("Could not mirror a message", exc_info=True)
+            self._in_sync = False
+            return
+        if _is_root_put(body.data):
+            # Puts all, user has what is sent
+            self._root_text = body.text
+            self._in_sync = True
+        else:
+            self._root_text = None
+
+    def _diff_root(self, body: EncodedMessage) -> EncodedMessage | None:
+        "Replace a put of the root with the changes to the previous root"
+        data = body.data
+        if not isinstance(data, dict):
+            return body
+        if data.get("type") == "batch":
+            # Not diffed but later diffs are based on it
+            for msg in data["data"]:
+                if _is_root_put(msg):
+                    self._last_root = msg["data"]
+            return body
+        if not _is_root_put(data):
+            return body
+        old, self._last_root = self._last_root, data["data"]
+        if old is None:
+            return body
+        ops = diff_content(old, data["data"])
+        if ops is None:
+            return body
+        if not ops:
+            return None
+        diff_body = encode_message(ops[0], codec=self.codec) if len(ops) == 1 else encode_batch(ops, codec=self.codec)
+        # Diff bigger than the content is not worth it
+        return diff_body if len(diff_body.text) < len(body.text) else body
+
+    def _format_send_message(self, data) -> EncodedMessage:
+        return encode_message(data, codec=self.codec)
 
     async def _publish(self, body):
         await self.start_conn.send(body)
 
+    async def _write(self, body: EncodedMessage):
+        size = len(body.text)
+        with self.tracer.start("miniappi.message.send", request_id=self.request_id, size=size):
+            start = time.perf_counter()
+            await self.start_conn.send(body)
+            metrics.send_seconds.observe(time.perf_counter() - start)
+        metrics.messages_out.inc()
+        metrics.bytes_out.inc(size)
+
     async def listen(self):
         "Listen the request channel"
         logger = self.get_logger()
         try:
             logger.info("Listening channel")
             self.is_running = True
-            async for message in self.start_conn.listen():
-                if message is not None:
-                    await self._handle_request_message(message)
-                await asyncio.sleep(0)
+            if self.dispatch == "sequential":
+                await self._listen()
+            else:
+                async with asyncio.TaskGroup() as tg:
+                    dispatcher = DISPATCHERS[self.dispatch](
+                        self._run_callbacks,
+                        task_group=tg,
+                        workers=settings.message_workers
+                    )
+                    self._dispatch_message = dispatcher.dispatch
+                    try:
+                        await self._listen()
+                    finally:
+                        dispatcher.close()
         finally:
             self.is_running = False
+            if self._writer is not None:
+                # User is gone, nothing to write to
+                self._writer.cancel()
+
+    async def _listen(self):
+        async for message in self.start_conn.listen():
+            if message is not None:
+                await self._handle_request_message(message)
+            await asyncio.sleep(0)
 
     async def close(self, send_stop=True):
         "Close listening and remove session"
         logger = self.get_logger()
+        if self.is_closed:
+            return
         logger.debug("Closing channel")
+        with self.tracer.start("miniappi.session.close", request_id=self.request_id, send_stop=send_stop) as span:
+            await self._close(send_stop)
+            span.set("dropped", self.n_dropped)
+
+    async def _close(self, send_stop: bool):
+        self.is_closed = True
         self._sessions.pop(self.start_args.request_id)
         for task in self.tasks:
             task.cancel()
+        if self.outbound is not None:
+            # Release senders waiting for space
+            self._clear_queue()
         if send_stop:
             await self._send_stop()
 
     async def _handle_request_message(self, msg: Message):
         if self._is_stop_message(msg):
             raise UserLeftException("Client requested to close")
-        for func in self.callbacks_message:
-            await func(msg)
+        metrics.messages_in.inc()
+        with self.tracer.start("miniappi.message.receive", request_id=self.request_id, content_id=message_key(msg)) as span:
+            if self.tracer.enabled:
+                span.set("size", len(json.dumps(msg.data)))
+            await self._dispatch_message(msg)
+
+    async def _run_callbacks(self, msg: Message):
+        tracer = self.tracer
+        for func in self.callbacks_message.match(msg):
+            start = time.perf_counter()
+            try:
+                if tracer.enabled:
+                    with tracer.start("miniappi.message.callback", request_id=self.request_id, callback=_callback_name(func)):
+                        await func(msg)
+                else:
+                    await func(msg)
+            finally:
+                metrics.callback_seconds.observe(time.perf_counter() - start)
 
     def get_logger(self):
         return logging.getLogger(__name__)
@@ -0,0 +1,331 @@
+import os
+import pickle
+import socket
+import asyncio
+import logging
+import multiprocessing
+from itertools import count
+from contextlib import asynccontextmanager
+from typing import Any, Callable, List, Literal
+
+from miniappi.config import settings
+from miniappi import metrics
+from .connection import AbstractClient, ClientConf, ServerConf, UserSessionArgs
+from .registry import BusRegistry, RegistryHub
+from .app import App
+
+LOGGER = logging.getLogger(__name__)
+
+type BalanceMethod = Literal["round-robin", "least-loaded"]
+
+class ShardChannel:
+    """Async channel between the runner
+    and a shard over a socket
+
+    Messages are tuples of kind and payload,
+    pickled and prefixed with their length.
+    Sending does not block: the frames are
+    buffered and written by the event loop
+    as the other end reads them."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        # Sent before the streams were opened
+        self._pending: List[bytes] = []
+
+    async def open(self):
+        "Open the streams in the running loop"
+        if self._writer is not None:
+            return
+        self._reader, self._writer = await asyncio.open_connection(sock=self.sock)
+        pending, self._pending = self._pending, []
+        for data in pending:
+            self._writer.write(data)
+
+    def send(self, kind: str, payload: Any = None):
+        data = pickle.dumps((kind, payload))
+        data = len(data).to_bytes(8, "big") + data
+        if self._writer is None:
+            self._pending.append(data)
+        elif self._writer.is_closing():
+            raise BrokenPipeError("Channel is closed")
+        else:
+            self._writer.write(data)
+
+    async def recv(self) -> tuple[str, Any]:
+        await self.open()
+        try:
+            size = int.from_bytes(await self._reader.readexactly(8), "big")
+            return pickle.loads(await self._reader.readexactly(size))
+        except asyncio.IncompleteReadError as exc:
+            raise EOFError("Channel closed") from exc
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        else:
+            self.sock.close()
+
+class ShardRegistry(BusRegistry):
+    "Registry sharing the sessions of the shards through the runner"
+
+    def __init__(self, channel: ShardChannel):
+        super().__init__()
+        self.channel = channel
+
+    def send_frame(self, frame: dict):
+        self.channel.send("registry", frame)
+
+class ShardClient(AbstractClient):
+    """Client of an app running in a shard
+
+    Session starts and the server config come
+    from the runner and the users are connected
+    with the wrapped client.
+
+    Args:
+        channel (ShardChannel): Pipe to the runner.
+        client (AbstractClient): Client to connect users.
+        index (int): Index of the shard.
+        registry (ShardRegistry): Registry of the app.
+    """
+
+    def __init__(self, channel: ShardChannel, client: AbstractClient, index: int, registry: ShardRegistry):
+        self.channel = channel
+        self.client = client
+        self.index = index
+        self.registry = registry
+
+    @asynccontextmanager
+    async def connect_user(self, start_args: UserSessionArgs):
+        try:
+            async with self.client.connect_user(start_args) as conn:
+                yield conn
+        finally:
+            self.channel.send("closed", start_args.request_id)
+
+    async def listen_app(self, config: ClientConf, setup_start: Callable[[ServerConf, ...], Any]):
+        while True:
+            try:
+                kind, payload = await self.channel.recv()
+            except EOFError:
+                # Runner is gone
+                return
+            match kind:
+                case "start":
+                    # The runner has the app connection
+                    self.client.set_server_conf(payload)
+                    await setup_start(payload)
+                case "open":
+                    yield payload
+                case "registry":
+                    # Sessions of other shards
+                    self.registry.handle_frame(payload)
+                case "stop":
+                    return
+
+def setup_shard(app: App, channel: ShardChannel, index: int):
+    "Set the app to run as a shard"
+    app.registry = ShardRegistry(channel)
+    app.sessions = app.registry.sessions
+    app.conn_client = ShardClient(channel, client=app.conn_client, index=index, registry=app.registry)
+    if app.metrics_port is not None:
+        # Each process has its own metrics.
+        # The runner serves the base port
+        app.metrics_port += 1 + index
+
+def _run_shard(app_factory: Callable[[], App], sock: socket.socket, index: int):
+    app = app_factory()
+    setup_shard(app, ShardChannel(sock), index)
+    try:
+        asyncio.run(app.start(echo_link=False))
+    except KeyboardInterrupt:
+        ...
+
+class Shard:
+    "Worker process as seen by the runner"
+
+    def __init__(self, index: int, channel: ShardChannel):
+        self.index = index
+        self.channel = channel
+        self.n_sessions = 0
+        self.is_alive = True
+        self.process: multiprocessing.Process | None = None
+
+    def send_frame(self, frame: dict):
+        "Send a registry frame to the shard"
+        if self.is_alive:
+            self.channel.send("registry", frame)
+
+class ShardedApp:
+    """Run an app over multiple processes
+
+    The runner connects the app to Miniappi
+    server and passes the opened user sessions
+    to the shards (worker processes) which each
+    run their own instance of the app. The shards
+    share their sessions through the runner thus
+    broadcasts to all sessions (ie. showing content
+    outside user scope) and waiting input from all
+    users work across the shards.
+
+    Note that each shard has its own app context
+    and runs ``on_start`` callbacks. Use
+    ``app.conn_client.index`` to do something
+    only in one shard.
+
+    If ``settings.metrics_port`` is set, the runner
+    serves its metrics on the port and each shard
+    on the port plus one plus its index.
+
+    Args:
+        app_factory (callable):
+            Function that creates the app. Must be
+            picklable (ie. defined in a module).
+        workers (int, optional):
+            Number of shards. By default from
+            settings or the number of CPUs.
+        balance ('round-robin', 'least-loaded', optional):
+            How sessions are assigned to the shards.
+            By default from settings.
+
+    Examples:
+        ```python
+        from miniappi import App
+        from miniappi.core.shard import ShardedApp
+
+        def create_app():
+            app = App()
+
+            @app.on_open()
+            async def new_user():
+                ...
+            return app
+
+        if __name__ == "__main__":
+            ShardedApp(create_app, workers=4).run()
+        ```
+    """
+
+    def __init__(self, app_factory: Callable[[], App],
+                 workers: int | None = None,
+                 balance: BalanceMethod | None = None):
+        self.app_factory = app_factory
+        self.n_workers = workers or settings.shard_workers or os.cpu_count() or 1
+        self.balance = balance or settings.shard_balance
+
+        # App in this process is used for
+        # configuration and connecting
+        self.app = app_factory()
+        self.shards: List[Shard] = []
+        self.hub = RegistryHub()
+        self.n_relayed = 0
+        self._counter = count()
+
+    def run(self, echo_link: bool | None = None):
+        "Run app (sync)"
+        asyncio.run(self.start(echo_link=echo_link))
+
+    async def start(self, echo_link: bool | None = None):
+        "Start the shards and the app"
+        self.shards = [self._spawn(index) for index in range(self.n_workers)]
+        for shard in self.shards:
+            await shard.channel.open()
+            self.hub.connect(shard)
+        metrics_server = None
+        if self.app.metrics_port is not None:
+            metrics_server = await metrics.start_http_server(self.app.metrics_port, host=settings.metrics_host)
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for shard in self.shards:
+                    tg.create_task(self._read(shard))
+                await self._listen(echo_link)
+                # Let the shards finish their sessions.
+                # Reading stops when the shards have exited
+                self._send_all("stop")
+                await self._join(timeout=settings.shard_stop_timeout)
+        finally:
+            # Crashed or cancelled
+            self._send_all("stop")
+            await self._join(timeout=0)
+            if metrics_server is not None:
+                metrics_server.close()
+
+    async def _listen(self, echo_link: bool | None):
+        app = self.app
+
+        async def setup_start(server_conf: ServerConf):
+            if settings.echo_url if echo_link is None else echo_link:
+                app.show_app_running(server_conf)
+            app.app_name = server_conf.app_name
+            app.is_running = True
+            self._send_all("start", server_conf)
+
+        try:
+            async for start_args in app.conn_client.listen_app(app._get_client_config(), setup_start=setup_start):
+                shard = self._get_shard()
+                shard.n_sessions += 1
+                shard.channel.send("open", start_args)
+        finally:
+            app.is_running = False
+
+    def _spawn(self, index: int) -> Shard:
+        ctx = multiprocessing.get_context(settings.shard_start_method)
+        parent_sock, child_sock = socket.socketpair()
+        shard = Shard(index, ShardChannel(parent_sock))
+        shard.process = ctx.Process(
+            target=_run_shard,
+            args=(self.app_factory, child_sock, index),
+            name=f"miniappi-shard-{index}",
+            daemon=True,
+        )
+        shard.process.start()
+        child_sock.close()
+        return shard
+
+    def _get_shard(self) -> Shard:
+        alive = [shard for shard in self.shards if shard.is_alive]
+        if not alive:
+            raise RuntimeError("All shards have stopped")
+        if self.balance == "least-loaded":
+            return min(alive, key=lambda shard: shard.n_sessions)
+        return alive[next(self._counter) % len(alive)]
+
+    def _send_all(self, kind: str, payload: Any = None):
+        for shard in self.shards:
+            if shard.is_alive:
+                try:
+                    shard.channel.send(kind, payload)
+                except (BrokenPipeError, OSError):
+                    shard.is_alive = False
+
+    async def _read(self, shard: Shard):
+        while True:
+            try:
+                kind, payload = await shard.channel.recv()
+            except (EOFError, OSError):
+                if shard.is_alive:
+                    LOGGER.error(f"Shard {shard.index} stopped")
+                shard.is_alive = False
+                self.hub.disconnect(shard)
+                return
+            match kind:
+                case "closed":
+                    shard.n_sessions -= 1
+                case "registry":
+                    if payload["kind"] == "broadcast":
+                        self.n_relayed += 1
+                    self.hub.handle(shard, payload)
+
+    async def _join(self, timeout: float | None):
+        for shard in self.shards:
+            process = shard.process
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+                await asyncio.to_thread(process.join)
+            shard.is_alive = False
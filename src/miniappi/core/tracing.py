@@ -0,0 +1,172 @@
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List
+
+LOGGER = logging.getLogger(__name__)
+
+class Span:
+    """Timed unit of work
+
+    This span does nothing and is used
+    when tracing is not enabled."""
+
+    __slots__ = ()
+
+    def set(self, key: str, value: Any):
+        "Set an attribute"
+        ...
+
+    def end(self, exc: BaseException | None = None):
+        "End the span (only the first call counts)"
+        ...
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(exc)
+
+_NOOP_SPAN = Span()
+
+class Tracer:
+    """Creates spans of the app's work
+
+    This tracer does nothing. Set a tracer
+    to the app to record the spans:
+
+    - ``miniappi.session.open``: Opening a session, including
+      ``miniappi.session.connect``, ``miniappi.session.enter_context``
+      and ``miniappi.session.start_callbacks``
+    - ``miniappi.message.receive``: Handling a message from a user
+    - ``miniappi.message.callback``: Running a message callback
+    - ``miniappi.message.send``: Writing a message to a user
+    - ``miniappi.session.close``: Closing a session
+    """
+
+    # Whether spans are recorded. Attributes that
+    # are costly to compute are set only if enabled
+    enabled: bool = False
+
+    def start(self, name: str, **attributes) -> Span:
+        "Start a span"
+        return _NOOP_SPAN
+
+@dataclass
+class SpanRecord:
+    "Ended span"
+    name: str
+    start: float
+    duration: float
+    attributes: Dict[str, Any] = field(default_factory=lambda: {})
+    error: BaseException | None = None
+
+class _RecordingSpan(Span):
+
+    __slots__ = ("tracer", "name", "attributes", "start_time", "is_ended")
+
+    def __init__(self, tracer: "HookTracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.start_time = time.perf_counter()
+        self.is_ended = False
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self, exc: BaseException | None = None):
+        if self.is_ended:
+            return
+        self.is_ended = True
+        self.tracer.emit(
+            SpanRecord(
+                name=self.name,
+                start=self.start_time,
+                duration=time.perf_counter() - self.start_time,
+                attributes=self.attributes,
+                error=exc,
+            )
+        )
+
+class HookTracer(Tracer):
+    """Tracer passing ended spans to functions
+
+    Args:
+        hooks (list of callables):
+            Functions called with ``SpanRecord``
+            when a span ends.
+
+    Examples:
+        ```python
+        from miniappi.core.tracing import HookTracer
+
+        def log_slow(record):
+            if record.duration > 0.1:
+                print(f"Slow {record.name}: {record.duration:.3f} s {record.attributes}")
+
+        app.tracer = HookTracer([log_slow])
+        ```
+    """
+
+    enabled = True
+
+    def __init__(self, hooks: Iterable[Callable[[SpanRecord], Any]] = ()):
+        self.hooks: List[Callable[[SpanRecord], Any]] = list(hooks)
+
+    def start(self, name: str, **attributes) -> Span:
+        return _RecordingSpan(self, name, attributes)
+
+    def emit(self, record: SpanRecord):
+        for hook in self.hooks:
+            try:
+                hook(record)
+            except Exception:
+                LOGGER.exception(f"Tracing hook {hook!r} failed")
+
+class _OpenTelemetrySpan(Span):
+
+    __slots__ = ("span", "is_ended")
+
+    def __init__(self, span):
+        self.span = span
+        self.is_ended = False
+
+    def set(self, key: str, value: Any):
+        self.span.set_attribute(key, value)
+
+    def end(self, exc: BaseException | None = None):
+        if self.is_ended:
+            return
+        self.is_ended = True
+        if exc is not None:
+            from opentelemetry.trace import Status, StatusCode
+            self.span.record_exception(exc)
+            self.span.set_status(Status(StatusCode.ERROR, str(exc)))
+        self.span.end()
+
+class OpenTelemetryTracer(Tracer):
+    """Tracer creating OpenTelemetry spans
+
+    Requires ``opentelemetry-api``. The spans are
+    exported by the OpenTelemetry SDK configured
+    in the application.
+
+    Args:
+        tracer (opentelemetry.trace.Tracer, optional):
+            Tracer to create the spans with. By default
+            from the global tracer provider.
+    """
+
+    enabled = True
+
+    def __init__(self, tracer=None):
+        if tracer is None:
+            from opentelemetry import trace
+            tracer = trace.get_tracer("miniappi")
+        self.tracer = tracer
+
+    def start(self, name: str, **attributes) -> Span:
+        return _OpenTelemetrySpan(
+            self.tracer.start_span(name, attributes=attributes)
+        )
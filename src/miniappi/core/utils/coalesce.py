@@ -0,0 +1,73 @@
+from typing import List
+from miniappi.core.connection import EncodedMessage
+from miniappi.core.connection.codec import Codec
+from miniappi.core.models.extensions import ExtendRight
+
+def _push_target(data):
+    "Get reference pushed to its end (None if not such push)"
+    if not isinstance(data, dict) or data.get("type") != "ref":
+        return None
+    method = data.get("method")
+    if (method == "push" and data.get("key") is None) or method == "extend":
+        return data.get("id")
+    return None
+
+def _put_target(data):
+    "Get what the put replaces (None if not a put)"
+    if not isinstance(data, dict) or data.get("method") != "put":
+        return None
+    if data.get("type") == "root":
+        return ("root", None)
+    return ("ref", data.get("id"))
+
+def _pushed_items(data: dict) -> list:
+    if data["method"] == "extend":
+        return data["data"]
+    return [data["data"]]
+
+def coalesce(messages: List[EncodedMessage], codec: Codec | None = None) -> List[EncodedMessage]:
+    """Merge consecutive messages to fewer messages
+
+    Consecutive pushes to the end of the same
+    reference are merged as one extend and
+    consecutive puts to the same target are
+    replaced by the last one. Other messages
+    are kept as they are.
+
+    Extend is not in the generated protocol
+    (see ``models.extensions``) so the client
+    must support it."""
+    # Runs of messages that can be merged
+    runs: List[List[EncodedMessage]] = []
+    for msg in messages:
+        if runs:
+            prev = runs[-1][-1].data
+            push_target = _push_target(msg.data)
+            if push_target is not None and push_target == _push_target(prev):
+                runs[-1].append(msg)
+                continue
+            put_target = _put_target(msg.data)
+            if put_target is not None and put_target == _put_target(prev):
+                # Only the last put matters
+                runs[-1] = [msg]
+                continue
+        runs.append([msg])
+
+    output = []
+    for run in runs:
+        if len(run) == 1:
+            output.append(run[0])
+            continue
+        items = []
+        for msg in run:
+            items.extend(_pushed_items(msg.data))
+        output.append(
+            EncodedMessage.encode(
+                ExtendRight(
+                    id=run[0].data["id"],
+                    data=items
+                ).model_dump(exclude_none=True),
+                codec=codec
+            )
+        )
+    return output
@@ -1,43 +1,142 @@
-from typing import Dict
+from typing import Any, Dict
 from miniappi.core.context import CurrentContent
-from miniappi.core.models.content import BaseContent
-from miniappi.core.models.message_types import InputMessage, PutRoot
+from miniappi.core.models.message_types import InputMessage
 
 def handle_message(curr_content: CurrentContent, msg: InputMessage):
+    "Apply a message to the content"
+    apply_message(curr_content, msg.model_dump(exclude_none=True))
 
-    if msg.type == "root":
-        curr_content.root = msg.data
-    elif msg.type == "ref":
-        reference = curr_content.references[msg.id]
-
-        if msg.method == "put":
-            curr_content.references[msg.id] = msg.data
-        elif msg.method == "delete":
-            curr_content.references.pop(msg.id, None)
-        elif msg.method == "push":
-            push_reference(curr_content.references, msg)
-        elif msg.method == "pop":
-            pop_reference(curr_content.references, msg)
+def apply_message(curr_content: CurrentContent, msg: Dict[str, Any]):
+    """Apply a sent message (as dict) to the content
+
+    The message is not modified so the same
+    message can be applied to many contents."""
+    msg_type = msg.get("type")
+    if msg_type == "batch":
+        for item in msg["data"]:
+            apply_message(curr_content, item)
+    elif msg_type == "root":
+        curr_content.root = msg["data"]
+        curr_content.references.clear()
+        curr_content.limits.clear()
+        register_references(curr_content, msg["data"])
+    elif msg_type == "ref":
+        method = msg.get("method")
+        ref_id = msg["id"]
+        references = curr_content.references
+
+        if method == "put":
+            if ref_id in references:
+                references[ref_id] = _copy(msg["data"])
+                _trim(curr_content, ref_id)
+            else:
+                # Content put by ID
+                root = _replace_content(curr_content.root, ref_id, msg["data"])
+                if root is not None:
+                    curr_content.root = root
+            register_references(curr_content, msg["data"])
+        elif method == "delete":
+            references.pop(ref_id, None)
+            curr_content.limits.pop(ref_id, None)
+        elif method in ("push", "extend", "pop") and ref_id not in references:
+            # The user doesn't have the reference (ie. a feed
+            # not shown yet). Its data comes when it's put
+            return
+        elif method == "push":
+            push_reference(references, msg)
+            _trim(curr_content, ref_id)
+        elif method == "extend":
+            references[ref_id].extend(msg["data"])
+            _trim(curr_content, ref_id)
+        elif method == "pop":
+            pop_reference(references, msg)
         else:
-            raise ValueError(f"unrecognized method: {msg.method}")
+            raise ValueError(f"unrecognized method: {method}")
+
+def _copy(data):
+    if isinstance(data, list):
+        return list(data)
+    if isinstance(data, dict):
+        return dict(data)
+    return data
+
+def register_references(curr_content: CurrentContent, data: Any):
+    "Add the references in the data"
+    if isinstance(data, dict):
+        if "reference" in data and "type" in data:
+            ref_id = data["reference"]
+            curr_content.references[ref_id] = _copy(data.get("data"))
+            if data["type"] == "array" and "limit" in data:
+                curr_content.limits[ref_id] = (data["limit"], data.get("method", "fifo"))
+            _trim(curr_content, ref_id)
+        for value in data.values():
+            register_references(curr_content, value)
+    elif isinstance(data, list):
+        for value in data:
+            register_references(curr_content, value)
+
+def _trim(curr_content: CurrentContent, ref_id: str):
+    "Remove items over the limit of an array (as the UI does)"
+    if ref_id not in curr_content.limits:
+        return
+    limit, method = curr_content.limits[ref_id]
+    reference = curr_content.references[ref_id]
+    if not isinstance(reference, list) or len(reference) <= limit:
+        return
+    if method == "fifo":
+        del reference[:len(reference) - limit]
+    elif method == "lifo":
+        del reference[limit:]
 
-def push_reference(references: Dict[str, any], msg: InputMessage):
-    reference = references[msg.id]
+def _replace_content(tree: Any, content_id: str, data: Any) -> Any:
+    "Get the tree with content replaced (None if not found)"
+    if isinstance(tree, dict):
+        if tree.get("id") == content_id and "contentType" in tree:
+            return data
+        for key, value in tree.items():
+            new = _replace_content(value, content_id, data)
+            if new is not None:
+                # Copied to not modify the sent messages
+                return {**tree, key: new}
+    elif isinstance(tree, list):
+        for i, value in enumerate(tree):
+            new = _replace_content(value, content_id, data)
+            if new is not None:
+                return [*tree[:i], new, *tree[i + 1:]]
+    return None
+
+def snapshot(curr_content: CurrentContent) -> Any:
+    "Get the root with the current data of the references"
+    return _with_references(curr_content.root, curr_content.references)
+
+def _with_references(tree: Any, references: Dict[str, Any]) -> Any:
+    if isinstance(tree, dict):
+        if "reference" in tree and "type" in tree and tree["reference"] in references:
+            tree = {**tree, "data": references[tree["reference"]]}
+        return {key: _with_references(value, references) for key, value in tree.items()}
+    if isinstance(tree, list):
+        return [_with_references(value, references) for value in tree]
+    return tree
+
+def push_reference(references: Dict[str, any], msg: Dict[str, Any]):
+    reference = references[msg["id"]]
+    key = msg.get("key")
     if isinstance(reference, list):
-        if msg.key is None:
-            reference.append(msg.data)
+        if key is None:
+            reference.append(msg["data"])
         else:
-            reference.insert(msg.key, msg.data)
+            reference.insert(int(key), msg["data"])
     elif isinstance(reference, dict):
-        if msg.key is None:
+        if key is None:
             raise KeyError("Key undefined")
         else:
-            reference[msg.key] = msg.data
+            reference[key] = msg["data"]
 
-def pop_reference(references: Dict[str, any], msg: InputMessage):
-    reference = references[msg.key]
-    if isinstance(msg.key, int):
-        reference: list
-        reference.pop(msg.key)
+def pop_reference(references: Dict[str, any], msg: Dict[str, Any]):
+    reference = references[msg["id"]]
+    key = msg.get("key")
+    if isinstance(reference, list):
+        if reference:
+            reference.pop(int(key) if key is not None else -1)
     elif isinstance(reference, dict):
-        reference.pop(msg.key)
+        reference.pop(key, None)
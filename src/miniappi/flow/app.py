@@ -23,7 +23,7 @@ class TempApp:
         }[app_meth]
 
     def _on_callback(self, *args, _app_meth, **kwargs):
-        on_init = _app_meth()
+        on_init = _app_meth(*args, **kwargs)
         def wrapper(func):
             out = on_init(func)
             # The app might create some wrapper
@@ -11,8 +11,9 @@ async def wait_for_input(content: BaseContent, show: bool = False, any_child=Tru
     If not in channel context, wait for all input"""
     def set_if_ready():
         if wait_for == "all" or (wait_for is None and not in_channel):
-            for session in app_context.sessions.values():
-                if session.request_id not in outputs:
+            # Sessions of all processes of the app
+            for request_id in app_context.registry.request_ids():
+                if request_id not in outputs:
                     # Not all ready, don't set the event
                     return
         event.set()
@@ -29,19 +30,22 @@ async def wait_for_input(content: BaseContent, show: bool = False, any_child=Tru
     event = asyncio.Event()
     outputs = {}
     with temp_app() as app:
-        @app.on_message()
+        @app.on_message(id=ids, request_id=caller_request_id if only_caller else None)
         async def get_message(msg: Message):
-            data: dict = msg.data
-            if data.get("id") in ids:
-                if only_caller and msg.request_id != caller_request_id:
-                    return
-                # We don't need the content ID with
-                # the msg so we just return data
-                outputs[msg.request_id] = data
-                set_if_ready()
-        if show:
-            await content.show()
-        await event.wait()
+            # We don't need the content ID with
+            # the msg so we just return data
+            outputs[msg.request_id] = msg.data
+            set_if_ready()
+        if only_caller:
+            if show:
+                await content.show()
+            await event.wait()
+        else:
+            # Input from sessions in other processes
+            async with app_context.registry.watch(ids, get_message):
+                if show:
+                    await content.show()
+                await event.wait()
 
     if only_caller:
         return outputs[caller_request_id]
@@ -0,0 +1,181 @@
+"""Metrics of the app
+
+Metrics are kept in memory and can be read
+in Prometheus text format with ``registry.render()``,
+served over HTTP with ``start_http_server`` or
+passed to a function periodically with ``report``.
+"""
+import math
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+class Metric(ABC):
+    "Base of the metrics"
+    type: str
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+
+    @abstractmethod
+    def samples(self) -> Iterable[Tuple[str, float]]:
+        "Get samples (name with labels, value)"
+        ...
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, value in self.samples():
+            lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    "Value that only increases"
+    type = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.value = 0
+
+    def inc(self, amount: int | float = 1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, self.value
+
+class Gauge(Counter):
+    "Value that increases and decreases"
+    type = "gauge"
+
+    def dec(self, amount: int | float = 1):
+        self.value -= amount
+
+    def set(self, value: int | float):
+        self.value = value
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram(Metric):
+    "Distribution of observed values"
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        # Last is for values over the buckets (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        total = 0
+        for bound, count in zip((*self.buckets, math.inf), self.counts):
+            total += count
+            yield f'{self.name}_bucket{{le="{_format_value(bound)}"}}', total
+        yield f"{self.name}_sum", self.sum
+        yield f"{self.name}_count", self.count
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value)) if value >= 1 else repr(value)
+    return repr(value)
+
+class MetricsRegistry:
+    "Collection of metrics"
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def _add[MetricT: Metric](self, metric: MetricT) -> MetricT:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name!r} already exists")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        "Create a counter"
+        return self._add(Counter(name, help))
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        "Create a gauge"
+        return self._add(Gauge(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        "Create a histogram"
+        return self._add(Histogram(name, help, buckets=buckets))
+
+    def render(self) -> str:
+        "Get the metrics in Prometheus text format"
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+    def collect(self) -> List[Tuple[str, float]]:
+        "Get all samples"
+        return [sample for metric in self.metrics.values() for sample in metric.samples()]
+
+registry = MetricsRegistry()
+
+sessions_active = registry.gauge("miniappi_sessions_active", "Open user sessions")
+sessions_opened = registry.counter("miniappi_sessions_opened_total", "User sessions opened")
+sessions_closed = registry.counter("miniappi_sessions_closed_total", "User sessions closed")
+messages_in = registry.counter("miniappi_messages_received_total", "Messages received from users")
+messages_out = registry.counter("miniappi_messages_sent_total", "Messages sent to users")
+bytes_in = registry.counter("miniappi_received_bytes_total", "Bytes received from users")
+bytes_out = registry.counter("miniappi_sent_bytes_total", "Bytes sent to users")
+send_seconds = registry.histogram("miniappi_send_seconds", "Time to write a message to a user")
+callback_seconds = registry.histogram("miniappi_callback_seconds", "Time to run a message callback")
+send_queue_depth = registry.histogram(
+    "miniappi_send_queue_depth", "Messages in the outbound queue of a session after enqueueing",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+messages_dropped = registry.counter("miniappi_messages_dropped_total", "Messages to users dropped from the outbound queues")
+reconnects = registry.counter("miniappi_reconnects_total", "Reconnection attempts of the app connection")
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, registry: MetricsRegistry):
+    try:
+        # Any request gets the metrics
+        while (await reader.readline()).strip():
+            ...
+        body = registry.render().encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+            b"Connection: close\r\n\r\n" + body
+        )
+        await writer.drain()
+    except ConnectionError:
+        ...
+    finally:
+        writer.close()
+
+async def start_http_server(port: int, host: str = "127.0.0.1", registry: MetricsRegistry = registry) -> asyncio.Server:
+    "Serve the metrics in Prometheus format over HTTP"
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_http(reader, writer, registry),
+        host=host, port=port
+    )
+    LOGGER.info(f"Serving metrics at http://{host}:{port}/metrics")
+    return server
+
+async def report(callback: Callable[[MetricsRegistry], object], interval: float, registry: MetricsRegistry = registry):
+    "Pass the metrics to a function periodically"
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            callback(registry)
+        except Exception:
+            LOGGER.exception("Reporting metrics failed")
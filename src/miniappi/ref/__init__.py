@@ -1 +1,2 @@
-from .feed import Feed
\ No newline at end of file
+from .feed import Feed
+from .record import Record
@@ -0,0 +1,52 @@
+import weakref
+from typing import Any, Iterable, Literal
+from pydantic import BaseModel, Field, PrivateAttr
+from miniappi.core import user_context, Session
+from miniappi.core.broadcast import broadcast
+from miniappi.core.session import encode_batch
+from miniappi.core.models.content import BaseMessage
+
+class ScopedReference(BaseModel):
+    """Reference sending its changes to the users
+
+    A change is sent to all user sessions ('app'),
+    only to the user in which the reference was
+    created in ('user') or depending on the
+    context ('auto')."""
+
+    scope: Literal["app", "user", "auto"] = Field(
+        exclude=True
+    )
+    _scoped_session: weakref.ref | None = PrivateAttr(
+        None,
+    )
+
+    def model_post_init(self, context: Any):
+        if self.scope == "user":
+            self._scoped_session = weakref.ref(user_context.session)
+
+    async def _publish(self, message: BaseMessage, session: Session | None = None):
+        if session is not None:
+            return await session.send(message)
+        if self.scope == "app":
+            await broadcast(message)
+        elif self.scope == "user":
+            await self._scoped_session().send(message)
+        elif self.scope == "auto":
+            try:
+                session = user_context.session
+            except LookupError:
+                await broadcast(message)
+            else:
+                await session.send(message)
+        else:
+            raise ValueError(f"Unknown scope: {self.scope}")
+
+    async def _publish_many(self, messages: Iterable[BaseMessage], session: Session | None = None):
+        "Publish messages as one frame"
+        messages = list(messages)
+        if len(messages) == 1:
+            await self._publish(messages[0], session=session)
+        elif messages:
+            codec = session.codec if session is not None else None
+            await self._publish(encode_batch(messages, codec=codec), session=session)
@@ -1,16 +1,15 @@
-import asyncio
 from uuid import uuid4
-import weakref
-from pydantic import Field, PrivateAttr
-from typing import Generic, TypeVar, Literal, List
-from collections import UserList, defaultdict
-from miniappi.core import user_context, app_context, Session
+from typing import Generic, TypeVar, Literal, List, Iterable
+from miniappi.core import Session
 from miniappi.core.models.message_types import PushRight, PutRef
+from miniappi.core.models.extensions import ExtendRight
 from miniappi.core.models.references import ArrayReference
+from miniappi.core.utils.buffer import RingBuffer
+from .base import ScopedReference
 
 T = TypeVar("T")
 
-class Feed(ArrayReference, Generic[T]):
+class Feed(ScopedReference, ArrayReference, Generic[T]):
     """Feed of content or data
 
     Useful for stream of content or other
@@ -65,12 +64,9 @@ class Feed(ArrayReference, Generic[T]):
         app.run()
         ```
     """
-    scope: Literal["app", "user", "auto"] = Field(
-        exclude=True
-    )
-    _scoped_session: Session | None = PrivateAttr(
-        None,
-    )
+
+    # Serialized as a list
+    data: RingBuffer
 
     def __init__(self, data: List[T] | None = None,
                  *,
@@ -85,47 +81,71 @@ class Feed(ArrayReference, Generic[T]):
             scope=scope,
             reference=id or str(uuid4()),
         )
-        self._trim()
-
-        if self.scope == "user":
-            self._scoped_session = weakref.ref(user_context.session)
-
-    def _trim(self):
-        if len(self.data) > self.limit:
-            if self.method == "fifo":
-                self.data = self.data[-self.limit:]
-            if self.method == "lifo":
-                self.data = self.data[:self.limit]
+        self.data = self._create_buffer(self.data)
+
+    def _create_buffer(self, items: Iterable[T]) -> RingBuffer:
+        if self.method == "fifo":
+            # Full buffer drops the oldest on append
+            return RingBuffer(items, maxlen=self.limit)
+        if self.method == "lifo":
+            buffer = RingBuffer()
+            for item in items:
+                if len(buffer) >= self.limit:
+                    break
+                buffer.append(item)
+            return buffer
+        return RingBuffer(items)
+
+    def _add(self, element: T):
+        if self.method == "lifo" and len(self.data) >= self.limit:
+            # The newest are dropped first
+            return
+        self.data.append(element)
 
     async def append(self, element: T, session: Session | None = None):
         """Append to the feed and show it to the user
         (if user context) or all (if no user context)"""
 
-        self.data.append(element)
-        self._trim()
-
-        if session is not None:
-            return await self._push_session(element, session)
-        if self.scope == "app":
-            await self._push_all(element)
-        elif self.scope == "user":
-            return await self._push_session(element, self._scoped_session())
-        elif self.scope == "auto":
-            try:
-                await self._push_session(element, user_context.session)
-            except LookupError:
-                await self._push_all(element)
-        else:
-            raise ValueError(f"Unknown scope: {self.scope}")
-
-    async def _push_all(self, element: T):
-        for session in app_context.sessions.values():
-            await self._push_session(element, session)
-
-    async def _push_session(self, elem: T, session: Session):
-        await session.send(
+        self._add(element)
+        await self._publish(
             PushRight(
                 id=self.reference,
-                data=elem
-            )
+                data=element
+            ),
+            session=session
+        )
+
+    async def extend(self, elements: Iterable[T], session: Session | None = None):
+        """Append multiple items to the feed and show
+        them with one message per user
+
+        The message uses the ``extend`` method which
+        the client must support (see ``models.extensions``)."""
+        elements = list(elements)
+        if self.method == "fifo":
+            # Only the last ones would be kept
+            elements = elements[-self.limit:] if self.limit > 0 else []
+        elif self.method == "lifo":
+            # Only what fits is kept
+            elements = elements[:max(self.limit - len(self.data), 0)]
+        if not elements:
+            return
+        self.data.extend(elements)
+        await self._publish(
+            ExtendRight(
+                id=self.reference,
+                data=elements
+            ),
+            session=session
+        )
+
+    async def replace(self, elements: Iterable[T], session: Session | None = None):
+        "Replace the items of the feed"
+        self.data = self._create_buffer(elements)
+        await self._publish(
+            PutRef(
+                id=self.reference,
+                data=list(self.data)
+            ),
+            session=session
         )
@@ -0,0 +1,116 @@
+from uuid import uuid4
+from typing import Any, Dict, Generic, TypeVar, Literal, Mapping
+from miniappi.core import Session
+from miniappi.core.models.message_types import PushRef, PopRef
+from miniappi.core.models.references import RecordReference
+from .base import ScopedReference
+
+T = TypeVar("T")
+
+_MISSING = object()
+
+class Record(ScopedReference, RecordReference, Generic[T]):
+    """Record (dict) of content or data
+
+    Useful for keyed content that changes
+    a key at a time, like cells of a dashboard.
+    Setting or removing a key sends only the
+    change of the key to the user.
+
+    Args:
+        data (dict, optional):
+            Initial data of the record.
+            Empty dict if not set.
+        limit (int, optional):
+            Number of keys at maximum. Adding
+            a new key to a full record raises
+            ValueError. By default 100.
+        scope ('app', 'user', 'auto'):
+            Whether a change triggers an event to
+            all user sessions ('app'), only for
+            the user in which the record was created
+            in ('user') or depending on the context
+            ('auto'). By default auto.
+        id (str, optional):
+            Reference ID. By default, unique identifier.
+
+    Examples:
+        ```python
+        from miniappi.ref import Record
+
+        @app.on_open()
+        async def new_user(session):
+            cells = Record[str]({"cpu": "0 %", "memory": "0 MB"})
+
+            await content.v0.cards.Card(
+                title="Usage",
+                body=cells
+            ).show()
+            await cells.set("cpu", "12 %")
+
+        app.run()
+        ```
+    """
+
+    def __init__(self, data: Dict[str, T] | None = None,
+                 *,
+                 limit: int = 100,
+                 scope: Literal["app", "user", "auto"] = "auto",
+                 id: str | None = None):
+        super().__init__(
+            data=dict(data or {}),
+            limit=limit,
+            scope=scope,
+            reference=id or str(uuid4()),
+        )
+        if len(self.data) > self.limit:
+            raise ValueError(f"Record has more than {self.limit} keys")
+
+    def __getitem__(self, key: str) -> T:
+        return self.data[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def _check_room(self, keys):
+        n_new = sum(1 for key in keys if key not in self.data)
+        if len(self.data) + n_new > self.limit:
+            raise ValueError(f"Record cannot have more than {self.limit} keys")
+
+    async def set(self, key: str, value: T, session: Session | None = None):
+        "Set a key and show the change"
+        self._check_room([key])
+        self.data[key] = value
+        await self._publish(
+            PushRef(id=self.reference, key=key, data=value),
+            session=session
+        )
+
+    async def pop(self, key: str, default: Any = _MISSING, session: Session | None = None) -> T:
+        "Remove a key and show the change"
+        if key not in self.data:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        value = self.data.pop(key)
+        await self._publish(
+            PopRef(id=self.reference, key=key),
+            session=session
+        )
+        return value
+
+    async def update(self, data: Mapping[str, T], session: Session | None = None):
+        "Set multiple keys and show the changes in one message"
+        data = dict(data)
+        self._check_room(data)
+        self.data.update(data)
+        await self._publish_many(
+            [
+                PushRef(id=self.reference, key=key, data=value)
+                for key, value in data.items()
+            ],
+            session=session
+        )
@@ -91,21 +91,15 @@ class StreamHandler:
 
     async def get_next_sent(self):
         "Get next sent message"
-        while True:
-            queue = self.conn_client.response_queue.get(
-                (self.stream.app_name, self.request_id)
-            )
-            if queue is not None:
-                while not queue.empty():
-                    message_data = await queue.get()
-                    message = Message(
-                        url=self.channel_name,
-                        request_id=self.request_id,
-                        data=message_data
-                    )
-                    self.sent.append(message)
-                    return message
-            await asyncio.sleep(0)
+        queue = self.conn_client.response_queue[self.get_url()]
+        message_data = await queue.get()
+        message = Message(
+            url=self.get_url(),
+            request_id=self.request_id,
+            data=message_data
+        )
+        self.sent.append(message)
+        return message
 
     async def send_message(self, msg: dict | str):
         "Send message to the streamer"
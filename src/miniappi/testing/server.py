@@ -0,0 +1,325 @@
+import json
+import asyncio
+import urllib.parse
+from uuid import uuid4
+from dataclasses import asdict
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+import httpx
+from httpx_ws.transport import ASGIWebSocketTransport
+from starlette.applications import Starlette
+from starlette.routing import WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from miniappi.config import settings
+from miniappi.core.connection.websocket import (
+    WebsocketUserSessionArgs,
+    ServerConf,
+    RecoveryConf,
+)
+
+class LocalUser:
+    """Simulated user of the local server
+
+    Args:
+        server (LocalServer): Server of the user.
+        request_id (str): ID of the user session.
+    """
+
+    def __init__(self, server: "LocalServer", request_id: str):
+        self.server = server
+        self.request_id = request_id
+
+        # Messages the app sent to the user
+        self.received: asyncio.Queue[dict | str] = asyncio.Queue()
+        self.n_received = 0
+
+        self.connected = asyncio.Event()
+        self.disconnected = asyncio.Event()
+        self._ws: WebSocket | None = None
+        # Channel if the app multiplexes the sessions
+        self._channel: WebSocket | None = None
+
+    async def send(self, data: dict):
+        "Send a message to the app"
+        await self._send_text(json.dumps(data))
+
+    async def receive(self) -> dict | str:
+        "Wait for the next message from the app"
+        return await self.received.get()
+
+    async def ping(self):
+        "Send ping frame to the app"
+        await self._send_text("ping")
+
+    async def leave(self):
+        "Leave the app"
+        await self.connected.wait()
+        if self._channel is not None:
+            await self._channel.send_text(
+                json.dumps({"type": "off", "request_id": self.request_id})
+            )
+        else:
+            await self._ws.send_text("OFF")
+
+    async def close(self):
+        "Close the user connection normally"
+        if self.disconnected.is_set():
+            return
+        if self._channel is not None:
+            await self.leave()
+        elif self._ws is not None:
+            await self._ws.close(code=1000)
+
+    async def _send_text(self, text: str):
+        await self.connected.wait()
+        if self._channel is not None:
+            if text == "ping":
+                # Pings are per channel
+                return
+            text = '{"type":"data","request_id":' + json.dumps(self.request_id) + ',"data":' + text + '}'
+            await self._channel.send_text(text)
+        else:
+            await self._ws.send_text(text)
+
+    def _put(self, data: dict | str):
+        self.n_received += 1
+        self.server.n_received += 1
+        self.received.put_nowait(data)
+
+    async def _run(self, websocket: WebSocket):
+        await websocket.accept()
+        self._ws = websocket
+        self.connected.set()
+        try:
+            while True:
+                text = await websocket.receive_text()
+                self._put(
+                    json.loads(text) if text.startswith(("{", "[")) else text
+                )
+        except WebSocketDisconnect:
+            ...
+        finally:
+            self.disconnected.set()
+
+class LocalServer:
+    """Local stand-in for Miniappi server
+
+    Implements the app protocol (start,
+    recovery, user and multiplexed channels) so that
+    apps using the websocket client can be
+    tested and benchmarked without network.
+
+    By default the server is run in the same
+    process (see ``client``) but it is also
+    an ASGI app that can be run with an ASGI
+    server (ie. uvicorn) to benchmark the
+    full network path.
+
+    Args:
+        ping_interval (float, optional):
+            Seconds between ping frames sent
+            to the app. By default no pings.
+
+    Examples:
+        ```python
+        server = LocalServer()
+        async with server.client() as client:
+            app.conn_client = WebsocketClient(client=client)
+            asyncio.create_task(app.start())
+
+            user = await server.add_user()
+            await user.send({"id": "my-button"})
+            print(await user.receive())
+        ```
+    """
+
+    def __init__(self, ping_interval: float | None = None):
+        self.ping_interval = ping_interval
+        self.n_channels = 0
+
+        self.users: Dict[str, LocalUser] = {}
+        self.app_name: str | None = None
+        self.n_app_connects = 0
+        self.n_received = 0
+        self.client_conf: dict | None = None
+
+        self._joins: asyncio.Queue[LocalUser] = asyncio.Queue()
+        self._recovery_key: str | None = None
+        self._app_ws: WebSocket | None = None
+        self._app_connected = asyncio.Event()
+        self._app_tasks: List[asyncio.Task] = []
+
+        url = urllib.parse.urlparse(settings.url_start)
+        self._origin = f"{url.scheme}://{url.netloc}"
+        self._start_path = url.path
+        self._recover_path = urllib.parse.urlparse(settings.url_recover).path
+        self._sessions_path = self._start_path.rsplit("/", 1)[0] + "/sessions"
+        self._multiplex_path = urllib.parse.urlparse(settings.url_multiplex).path
+
+    def get_user_url(self, request_id: str) -> str:
+        "Get URL of the user channel"
+        return f"{self._origin}{self._sessions_path}/{self.app_name}/{request_id}"
+
+    def create_app(self) -> Starlette:
+        "Create ASGI app of the server"
+        return Starlette(
+            routes=[
+                WebSocketRoute(self._start_path, self._start),
+                WebSocketRoute(self._start_path + "/{app_name}", self._start),
+                WebSocketRoute(self._recover_path + "/{recovery_key}", self._recover),
+                WebSocketRoute(self._sessions_path + "/{app_name}/{request_id}", self._user_channel),
+                WebSocketRoute(self._multiplex_path + "/{app_name}", self._multiplex_channel),
+            ],
+        )
+
+    @asynccontextmanager
+    async def client(self):
+        "HTTP client connected to the server in this process"
+        transport = ASGIWebSocketTransport(self.create_app())
+        async with httpx.AsyncClient(transport=transport) as client:
+            try:
+                yield client
+            finally:
+                # See: https://github.com/frankie567/httpx-ws/discussions/79#discussioncomment-12205278
+                transport.exit_stack = None
+                await asyncio.sleep(0)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000):
+        "Serve over network (requires uvicorn)"
+        import uvicorn
+        config = uvicorn.Config(self.create_app(), host=host, port=port, log_level="warning")
+        await uvicorn.Server(config).serve()
+
+    async def wait_app(self):
+        "Wait till the app is connected"
+        await self._app_connected.wait()
+
+    async def add_user(self, request_id: str | None = None) -> LocalUser:
+        "Join a new user to the app and wait for the connection"
+        request_id = request_id or str(uuid4())
+        user = LocalUser(self, request_id)
+        self.users[request_id] = user
+        await self._joins.put(user)
+        await user.connected.wait()
+        return user
+
+    async def add_users(self, n: int) -> List[LocalUser]:
+        "Join multiple users concurrently"
+        return list(await asyncio.gather(*(self.add_user() for _ in range(n))))
+
+    async def drop_app(self, code: int = 1012):
+        "Close the app connection abnormally to make the app reconnect"
+        self._app_connected.clear()
+        self._stop_app_tasks()
+        await self._app_ws.close(code=code)
+
+    def _stop_app_tasks(self):
+        for task in self._app_tasks:
+            task.cancel()
+
+    async def close(self):
+        "Close the app and user connections normally"
+        for user in self.users.values():
+            await user.close()
+        if self._app_ws is not None:
+            self._stop_app_tasks()
+            await self._app_ws.close(code=1000)
+
+    async def _start(self, websocket: WebSocket):
+        await websocket.accept()
+        self.client_conf = await websocket.receive_json()
+        self.app_name = self.client_conf.get("app_name") or str(uuid4())
+        await websocket.send_json(asdict(
+            ServerConf(
+                app_name=self.app_name,
+                app_url=f"{settings.url_apps}/{self.app_name}"
+            )
+        ))
+        await self._serve_app(websocket)
+
+    async def _recover(self, websocket: WebSocket):
+        if websocket.path_params["recovery_key"] != self._recovery_key:
+            await websocket.close(code=1008)
+            return
+        await websocket.accept()
+        await self._serve_app(websocket)
+
+    async def _serve_app(self, websocket: WebSocket):
+        self._recovery_key = str(uuid4())
+        await websocket.send_json(asdict(
+            RecoveryConf(recovery_key=self._recovery_key)
+        ))
+        self._app_ws = websocket
+        self.n_app_connects += 1
+        self._app_connected.set()
+
+        tasks = self._app_tasks = [
+            asyncio.create_task(self._send_joins(websocket)),
+            asyncio.create_task(self._wait_disconnect(websocket)),
+        ]
+        if self.ping_interval is not None:
+            tasks.append(asyncio.create_task(self._send_pings(websocket)))
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _send_joins(self, websocket: WebSocket):
+        while True:
+            user = await self._joins.get()
+            await websocket.send_json(asdict(
+                WebsocketUserSessionArgs(
+                    request_id=user.request_id,
+                    user_url=self.get_user_url(user.request_id)
+                )
+            ))
+
+    async def _send_pings(self, websocket: WebSocket):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await websocket.send_text("ping")
+
+    async def _wait_disconnect(self, websocket: WebSocket):
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    async def _user_channel(self, websocket: WebSocket):
+        request_id = websocket.path_params["request_id"]
+        user = self.users.get(request_id)
+        if user is None or websocket.path_params["app_name"] != self.app_name:
+            await websocket.close(code=1008)
+            return
+        await user._run(websocket)
+
+    async def _multiplex_channel(self, websocket: WebSocket):
+        if websocket.path_params["app_name"] != self.app_name:
+            await websocket.close(code=1008)
+            return
+        await websocket.accept()
+        self.n_channels += 1
+        users: Dict[str, LocalUser] = {}
+        try:
+            while True:
+                frame = json.loads(await websocket.receive_text())
+                user = users.get(frame["request_id"])
+                match frame["type"]:
+                    case "open":
+                        user = self.users[frame["request_id"]]
+                        users[user.request_id] = user
+                        user._channel = websocket
+                        user.connected.set()
+                    case "data":
+                        user._put(frame["data"])
+                    case "close":
+                        del users[user.request_id]
+                        user.disconnected.set()
+        except WebSocketDisconnect:
+            ...
+        finally:
+            for user in users.values():
+                user.disconnected.set()
@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+
+from miniappi.core import App, Session, broadcast
+from miniappi.testing.external import listen
+from miniappi.content import Loading
+
+@pytest.mark.asyncio
+async def test_broadcast(mock_server):
+    app = App()
+    ready = asyncio.Event()
+    results = []
+
+    @app.on_start()
+    async def run_app():
+        while len(app.sessions) < 2:
+            await asyncio.sleep(0)
+        results.append(await broadcast(Loading(id="mycomp")))
+        ready.set()
+
+    asyncio.create_task(app.start())
+    async with listen(
+        app,
+        request_id="1",
+    ) as handler_1:
+        async with listen(
+            app,
+            request_id="2",
+        ) as handler_2:
+            await ready.wait()
+
+    result = results[0]
+    assert result.ok
+    assert sorted(result.sent) == ["1", "2"]
+    for handler in (handler_1, handler_2):
+        assert [msg.data for msg in handler.sent] == [
+            {
+                "type": "root",
+                "method": "put",
+                "data": {
+                    "contentType": "Loading.vue",
+                    "id": "mycomp"
+                }
+            }
+        ]
+
+@pytest.mark.asyncio
+async def test_broadcast_failed(mock_server):
+    app = App()
+    ready = asyncio.Event()
+    results = []
+
+    @app.on_start()
+    async def run_app():
+        while len(app.sessions) < 3:
+            await asyncio.sleep(0)
+
+        async def fail(body):
+            raise ConnectionError("Intentional")
+
+        async def hang(body):
+            await asyncio.Event().wait()
+
+        app.sessions["2"].start_conn.send = fail
+        app.sessions["3"].start_conn.send = hang
+
+        results.append(await broadcast(Loading(id="mycomp"), timeout=0.01))
+        results.append(set(app.sessions))
+        ready.set()
+
+    asyncio.create_task(app.start())
+    async with listen(app, request_id="1") as handler_1:
+        async with listen(app, request_id="2") as handler_2:
+            async with listen(app, request_id="3") as handler_3:
+                await ready.wait()
+
+    result = results[0]
+    assert not result.ok
+    assert result.sent == ["1"]
+    assert isinstance(result.failed["2"], ConnectionError)
+    assert isinstance(result.failed["3"], TimeoutError)
+    # Timed out session was closed
+    assert results[1] == {"1", "2"}
+    assert len(handler_1.sent) == 1
+
+@pytest.mark.asyncio
+async def test_broadcast_timeout_own_session(mock_server):
+    app = App()
+    ready = asyncio.Event()
+    results = []
+
+    @app.on_open(pass_session=True)
+    async def run_session(session: Session):
+        if session.request_id != "1":
+            return
+        while len(app.sessions) < 2:
+            await asyncio.sleep(0)
+
+        async def hang(body):
+            await asyncio.Event().wait()
+
+        # This session times out
+        session.start_conn.send = hang
+        results.append(await broadcast(Loading(id="mycomp"), timeout=0.01))
+        ready.set()
+
+    asyncio.create_task(app.start())
+    async with listen(app, request_id="1") as handler_1:
+        async with listen(app, request_id="2") as handler_2:
+            await ready.wait()
+            while "1" in app.sessions:
+                await asyncio.sleep(0)
+
+    result = results[0]
+    assert result.sent == ["2"]
+    assert isinstance(result.failed["1"], TimeoutError)
+    assert len(handler_2.sent) == 1
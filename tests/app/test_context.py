@@ -1,10 +1,10 @@
 import asyncio
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 import pytest
 
 from miniappi import settings
-from miniappi.core.models.context import ContextModel
+from miniappi.core.models.context import ContextModel, CONTEXTS
 
 from miniappi.core import App, user_context, app_context, Session
 from miniappi.core.models.message_types import PutRoot
@@ -297,3 +297,62 @@ async def test_custom_context(mock_server):
         "on_close",
         "on_end",
     ]
+
+def test_inherited_fields():
+    class BaseContext(ContextModel):
+        name: str = "base"
+        value: int
+
+    class MyContext(BaseContext):
+        extra: list = field(default_factory=list)
+
+    ctx = MyContext()
+    assert list(ctx.__fields__) == ["name", "value", "extra"]
+    with pytest.raises(LookupError):
+        ctx.name
+
+    with ctx.enter({"value": 1}):
+        assert ctx.name == "base"
+        assert ctx.value == 1
+        assert ctx.extra == []
+        ctx.value = 2
+        assert ctx.data == {"name": "base", "value": 2, "extra": []}
+        with pytest.raises(AttributeError):
+            ctx.missing = 1
+    with pytest.raises(TypeError):
+        with ctx.enter():
+            ...
+
+def test_enter_reset_on_error():
+    class MyContext(ContextModel):
+        value: int = 0
+
+    ctx = MyContext()
+    assert not ctx.exists()
+    with pytest.raises(RuntimeError):
+        with ctx.enter():
+            assert ctx.exists()
+            with pytest.raises(LookupError):
+                with ctx.enter():
+                    ...
+            raise RuntimeError("Intentional")
+    # Context was reset
+    assert not ctx.exists()
+
+def test_context_name_in_spawned_worker():
+    # The main module is __mp_main__ in spawned workers
+    # and the contexts must be found by the same name
+    class MainContext(ContextModel):
+        value: int = 0
+    MainContext.__module__ = "__main__"
+
+    class WorkerContext(ContextModel):
+        value: int = 0
+    WorkerContext.__module__ = "__mp_main__"
+    WorkerContext.__qualname__ = MainContext.__qualname__
+
+    main_ctx = MainContext()
+    worker_ctx = WorkerContext()
+    assert main_ctx.store.name.startswith("__main__.")
+    assert worker_ctx.store.name.startswith("__main__.")
+    assert CONTEXTS[main_ctx.store.name] is main_ctx
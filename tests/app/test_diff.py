@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+
+from miniappi import settings
+from miniappi.core import App, Session
+from miniappi.core.diff import diff_content
+from miniappi.testing.external import listen
+from miniappi.content import v0
+from miniappi.ref import Feed
+
+def _column(title="Hello", items=("a", "b"), feed=None):
+    return v0.layouts.Column(
+        id="col",
+        contents=[
+            v0.Title(id="title", text=title),
+            v0.layouts.Row(
+                id="row",
+                contents=feed if feed is not None else [v0.Title(id=f"item-{i}", text=i) for i in items]
+            ),
+        ]
+    )
+
+def _tree(**kwargs):
+    return _column(**kwargs).model_dump(exclude_none=True, warnings=False)
+
+def test_diff_content():
+    old = _tree()
+    assert diff_content(old, _tree()) == []
+
+    ops = diff_content(old, _tree(title="Changed"))
+    assert [op.model_dump(exclude_none=True) for op in ops] == [
+        {"type": "ref", "method": "put", "id": "title", "data": {"id": "title", "text": "Changed", "contentType": "v0/Title.vue"}},
+    ]
+
+    # Changed list: the parent is put
+    ops = diff_content(old, _tree(items=("a", "b", "c")))
+    assert [op.id for op in ops] == ["row"]
+
+    # Other root
+    assert diff_content(old, v0.Title(id="other", text="").model_dump(exclude_none=True)) is None
+
+def test_diff_references():
+    feed = Feed([1, 2], id="feed")
+    old = _tree(feed=feed)
+    assert diff_content(old, _tree(feed=feed)) == []
+
+    # Same reference with other data
+    ops = diff_content(old, _tree(feed=Feed([3], id="feed")))
+    assert [(op.id, op.data["contents"]["data"]) for op in ops] == [("row", [3])]
+
+    ops = diff_content(old, _tree())
+    assert [op.model_dump(exclude_none=True)["method"] for op in ops] == ["put", "delete"]
+    assert ops[1].id == "feed"
+
+@pytest.mark.asyncio
+async def test_send_diff(mock_server, monkeypatch):
+    monkeypatch.setattr(settings, "content_diff", True)
+    app = App()
+    ready = asyncio.Event()
+    items = [f"item {i}" for i in range(20)]
+
+    @app.on_open(pass_session=True)
+    async def send_messages(session: Session):
+        await session.send(_column(items=items))
+        # Only the title changes
+        await session.send(_column(title="Changed", items=items))
+        # Nothing changes
+        await session.send(_column(title="Changed", items=items))
+        # Other root
+        await session.send(v0.Title(id="other", text="Bye"))
+        ready.set()
+
+    asyncio.create_task(app.start())
+    async with listen(app, request_id="1") as handler:
+        await ready.wait()
+
+    sent = [msg.data for msg in handler.sent]
+    assert len(sent) == 3
+    assert sent[0]["type"] == "root"
+    assert sent[1] == {"type": "ref", "method": "put", "id": "title", "data": {"id": "title", "text": "Changed", "contentType": "v0/Title.vue"}}
+    assert sent[2]["type"] == "root"
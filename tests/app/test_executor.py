@@ -0,0 +1,93 @@
+import os
+import asyncio
+import threading
+import pytest
+
+from miniappi.core import App, user_context
+from miniappi.core.connection import Message
+from miniappi.core.executor import run_in_executor, run_with_contexts, snapshot_contexts
+from miniappi.core.models.context import ContextModel
+from miniappi.testing.external import listen
+
+def get_user():
+    # Run in a worker process
+    return user_context.request_id, user_context.extra, os.getpid()
+
+@pytest.mark.asyncio
+async def test_thread(mock_server):
+    app = App()
+    calls = []
+
+    @app.on_open(executor="thread")
+    def opened():
+        calls.append(("open", user_context.request_id, threading.current_thread().name))
+
+    @app.on_message(id="my-button", executor="thread")
+    def pressed(msg: Message):
+        calls.append(("message", user_context.request_id, threading.current_thread().name))
+
+    asyncio.create_task(app.start())
+    async with listen(app, request_id="1") as handler:
+        await handler.send_message({"id": "my-button", "value": 1})
+        while len(calls) < 2:
+            await asyncio.sleep(0.001)
+
+    assert [call[:2] for call in calls] == [("open", "1"), ("message", "1")]
+    assert all(call[2].startswith("miniappi") for call in calls)
+    assert "thread" in app.executors
+
+@pytest.mark.asyncio
+async def test_process(mock_server):
+    app = App()
+    results = []
+
+    @app.on_open()
+    async def opened():
+        user_context.extra["x"] = 1
+        results.append(await run_in_executor("process", get_user))
+
+    asyncio.create_task(app.start())
+    async with listen(app, request_id="1"):
+        async with asyncio.timeout(10):
+            while not results:
+                await asyncio.sleep(0.01)
+
+    request_id, extra, pid = results[0]
+    assert request_id == "1"
+    assert extra == {"x": 1}
+    assert pid != os.getpid()
+    app.shutdown_executors()
+
+def test_invalid():
+    app = App()
+    with pytest.raises(TypeError):
+        @app.on_message(executor="thread")
+        async def func(msg):
+            ...
+    with pytest.raises(TypeError):
+        @app.on_open(pass_session=True, executor="process")
+        def func(session):
+            ...
+
+class CountedPickle:
+    n_pickled = 0
+
+    def __reduce__(self):
+        type(self).n_pickled += 1
+        return (CountedPickle, ())
+
+def test_snapshot_pickles_once():
+    class SnapshotContext(ContextModel):
+        value: object = None
+        lock: object = None
+
+    ctx = SnapshotContext()
+    with ctx.enter({"value": CountedPickle(), "lock": threading.Lock()}):
+        snapshot = snapshot_contexts()
+    assert CountedPickle.n_pickled == 1
+
+    data = dict(snapshot)[ctx.store.name]
+    # Lock cannot be pickled
+    assert list(data) == ["value"]
+    assert run_with_contexts(snapshot, lambda: type(ctx.value)) is CountedPickle
+    assert CountedPickle.n_pickled == 1
@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+
+from miniappi import metrics, settings
+from miniappi.core import App
+from miniappi.core.connection import Message
+from miniappi.core.connection.mock import MockUserSessionArgs
+from miniappi.metrics import MetricsRegistry
+from miniappi.testing.external import listen
+from miniappi.content import v0
+
+@pytest.mark.asyncio
+async def test_session_metrics(mock_server):
+    app = App()
+
+    @app.on_message(id="my-button")
+    async def pressed(msg: Message):
+        await v0.Title(id="reply", text="pressed").show()
+
+    opened = metrics.sessions_opened.value
+    closed = metrics.sessions_closed.value
+    messages_in = metrics.messages_in.value
+    messages_out = metrics.messages_out.value
+    bytes_out = metrics.bytes_out.value
+    n_callbacks = metrics.callback_seconds.count
+    n_sends = metrics.send_seconds.count
+
+    asyncio.create_task(app.start())
+    async with listen(app, request_id="1", wait_close=False) as handler:
+        await handler.send_message({"id": "my-button"})
+        await handler.get_next_sent()
+        assert metrics.sessions_opened.value >= opened + 1
+        assert metrics.sessions_active.value >= 1
+        await app.sessions["1"].close()
+    async with asyncio.timeout(1):
+        while metrics.sessions_closed.value == closed:
+            await asyncio.sleep(0)
+
+    assert metrics.sessions_closed.value >= closed + 1
+    assert metrics.messages_in.value >= messages_in + 1
+    assert metrics.messages_out.value >= messages_out + 1
+    assert metrics.bytes_out.value > bytes_out
+    assert metrics.callback_seconds.count >= n_callbacks + 1
+    assert metrics.send_seconds.count > n_sends
+
+def test_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter("my_total", "Things")
+    gauge = registry.gauge("my_active", "Active things")
+    histogram = registry.histogram("my_seconds", "Durations", buckets=(0.1, 1))
+    counter.inc()
+    counter.inc(2)
+    gauge.inc()
+    gauge.dec()
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert registry.render() == "\n".join([
+        "# HELP my_total Things",
+        "# TYPE my_total counter",
+        "my_total 3",
+        "# HELP my_active Active things",
+        "# TYPE my_active gauge",
+        "my_active 0",
+        "# HELP my_seconds Durations",
+        "# TYPE my_seconds histogram",
+        'my_seconds_bucket{le="0.1"} 1',
+        'my_seconds_bucket{le="1"} 2',
+        'my_seconds_bucket{le="+Inf"} 3',
+        "my_seconds_sum 5.55",
+        "my_seconds_count 3",
+    ]) + "\n"
+    with pytest.raises(ValueError):
+        registry.counter("my_total", "Again")
+
+@pytest.mark.asyncio
+async def test_http_server():
+    registry = MetricsRegistry()
+    registry.counter("my_total", "Things").inc()
+    server = await metrics.start_http_server(0, registry=registry)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+    finally:
+        server.close()
+    head, body = response.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200 OK")
+    assert b"my_total 1" in body
+
+@pytest.mark.asyncio
+async def test_queue_metrics(mock_server, monkeypatch):
+    monkeypatch.setattr(settings, "send_queue_size", 2)
+    monkeypatch.setattr(settings, "send_queue_policy", "drop-oldest")
+    app = App()
+    ready = asyncio.Event()
+    dropped = metrics.messages_dropped.value
+    n_depths = metrics.send_queue_depth.count
+
+    @app.on_open(pass_session=True)
+    async def send_messages(session):
+        release = asyncio.Event()
+        send = session.start_conn.send
+        async def slow_send(body):
+            await release.wait()
+            await send(body)
+        session.start_conn.send = slow_send
+
+        for i in range(5):
+            await session.send(v0.Title(id=str(i), text=str(i)))
+        release.set()
+        await session.flush()
+        ready.set()
+
+    asyncio.create_task(app.start())
+    async with listen(app, request_id="1") as handler:
+        await ready.wait()
+
+    assert metrics.messages_dropped.value >= dropped + 3
+    assert metrics.send_queue_depth.count >= n_depths + 5
+    assert 'miniappi_send_queue_depth_bucket{le="2"}' in metrics.registry.render()
+
+class FailingContext:
+    def __enter__(self):
+        raise RuntimeError("Intentional")
+
+    def __exit__(self, *exc):
+        ...
+
+@pytest.mark.asyncio
+async def test_session_metrics_failed_open(mock_server):
+    app = App()
+    app.channel_context_managers.append(FailingContext())
+    active = metrics.sessions_active.value
+
+    with pytest.raises(RuntimeError):
+        await app.open_session(MockUserSessionArgs(request_id="1", user_url="user/1"))
+    assert metrics.sessions_active.value == active
+    assert not app.sessions
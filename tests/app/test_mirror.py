@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+
+from miniappi import settings
+from miniappi.core import App, Session
+from miniappi.core.context import CurrentContent
+from miniappi.core.utils.message import apply_message, snapshot
+from miniappi.core.models.message_types import PutRoot, PutRef, PushRight, PopRef, DelRef
+from miniappi.core.models.extensions import ExtendRight
+from miniappi.testing.external import listen
+from miniappi.content import v0
+from miniappi.ref import Feed, Record
+
+def _apply(content, msg):
+    apply_message(content, msg.model_dump(exclude_none=True))
+
+def test_apply_message():
+    content = CurrentContent()
+    feed = Feed([1, 2], limit=3, id="feed")
+    record = Record({"a": 1}, id="record")
+    root = PutRoot(data=v0.layouts.Column(
+        id="col",
+        contents=[v0.Title(id="title", text="Hello"), v0.cards.Card(id="card", body=record), v0.layouts.Row(id="row", contents=feed)]
+    )).model_dump(exclude_none=True, warnings=False)
+    apply_message(content, root)
+    assert content.references == {"feed": [1, 2], "record": {"a": 1}}
+
+    _apply(content, ExtendRight(id="feed", data=[3, 4]))
+    _apply(content, PushRight(id="feed", data=5))
+    # Trimmed by the limit of the feed
+    assert content.references["feed"] == [3, 4, 5]
+
+    _apply(content, PutRef(id="record", data={"b": 2}))
+    _apply(content, PopRef(id="record", key="b"))
+    assert content.references["record"] == {}
+
+    # Content put by ID
+    _apply(content, PutRef(id="title", data={"id": "title", "text": "Changed", "contentType": "v0/Title.vue"}))
+    assert content.root["contents"][0]["text"] == "Changed"
+    # Sent message is not modified
+    assert root["data"]["contents"][0]["text"] == "Hello"
+
+    assert snapshot(content)["contents"][2]["contents"]["data"] == [3, 4, 5]
+
+    _apply(content, DelRef(id="feed"))
+    assert "feed" not in content.references
+
+@pytest.mark.asyncio
+async def test_session_mirror(mock_server, monkeypatch):
+    monkeypatch.setattr(settings, "content_mirror", True)
+    app = App()
+    ready = asyncio.Event()
+    feed = Feed(["a"], id="feed")
+
+    @app.on_open(pass_session=True)
+    async def send_messages(session: Session):
+        col = v0.layouts.Column(id="col", contents=feed)
+        await col.show()
+        # Already shown
+        await col.show()
+        await feed.append("b")
+        assert session.content.references["feed"] == ["a", "b"]
+        # User already has it
+        await session.send(PutRef(id="feed", data=["a", "b"]))
+        await session.resync()
+        ready.set()
+
+    asyncio.create_task(app.start())
+    async with listen(app, request_id="1") as handler:
+        await ready.wait()
+
+    sent = [msg.data for msg in handler.sent]
+    assert [(msg["type"], msg["method"]) for msg in sent] == [
+        ("root", "put"),
+        ("ref", "push"),
+        ("root", "put"),
+    ]
+    assert sent[-1]["data"]["contents"]["data"] == ["a", "b"]
+
+@pytest.mark.asyncio
+async def test_mirror_push_before_show(mock_server, monkeypatch):
+    monkeypatch.setattr(settings, "content_mirror", True)
+    app = App()
+    ready = asyncio.Event()
+
+    @app.on_open(pass_session=True)
+    async def send_messages(session: Session):
+        feed = Feed(["a"], id="feed")
+        # Not shown yet
+        await feed.append("b")
+        await feed.extend(["c"])
+        assert session.content.references == {}
+        await v0.layouts.Column(id="col", contents=feed).show()
+        assert session.content.references["feed"] == ["a", "b", "c"]
+        ready.set()
+
+    asyncio.create_task(app.start())
+    async with listen(app, request_id="1") as handler:
+        await ready.wait()
+
+    sent = [msg.data for msg in handler.sent]
+    assert [(msg["type"], msg["method"]) for msg in sent] == [
+        ("ref", "push"),
+        ("ref", "extend"),
+        ("root", "put"),
+    ]
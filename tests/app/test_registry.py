@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+
+from miniappi.core import App
+from miniappi.core.connection.mock import MockClient
+from miniappi.core.registry import RegistryHub, UnixSocketRegistry
+from miniappi.content import v0
+
+class Peer:
+    def __init__(self):
+        self.frames = []
+
+    def send_frame(self, frame):
+        self.frames.append(frame)
+
+def test_hub():
+    hub = RegistryHub()
+    peer_1, peer_2 = Peer(), Peer()
+    hub.connect(peer_1)
+    hub.handle(peer_1, {"kind": "join", "request_id": "1"})
+    hub.handle(peer_1, {"kind": "watch", "watch_id": "w", "ids": ["b"], "request_id": None})
+
+    # New peer gets the current state
+    hub.connect(peer_2)
+    assert peer_2.frames == [
+        {"kind": "members", "request_ids": ["1"]},
+        {"kind": "watch", "watch_id": "w", "ids": ["b"], "request_id": None},
+    ]
+    peer_2.frames.clear()
+
+    # Input goes only to the watcher
+    hub.handle(peer_2, {"kind": "input", "watch_id": "w", "message": {}})
+    assert peer_1.frames[-1]["kind"] == "input"
+    assert peer_2.frames == []
+
+    hub.disconnect(peer_1)
+    assert peer_2.frames == [
+        {"kind": "leave", "request_id": "1"},
+        {"kind": "unwatch", "watch_id": "w"},
+    ]
+
+@pytest.mark.asyncio
+async def test_unix_socket(tmp_path):
+    path = str(tmp_path / "registry.sock")
+    button = v0.widgets.Button(id="button", label="Press")
+    results = []
+
+    app_1 = App(registry=UnixSocketRegistry(path))
+    app_1.conn_client = MockClient()
+    app_2 = App(registry=UnixSocketRegistry(path))
+    app_2.conn_client = MockClient()
+
+    @app_1.on_start()
+    async def wait_all():
+        while len(app_1.registry) < 2:
+            await asyncio.sleep(0.001)
+        results.append(await button.wait_input(wait_for="all"))
+
+    tasks = [
+        asyncio.create_task(app_1.start(echo_link=False)),
+        asyncio.create_task(app_2.start(echo_link=False)),
+    ]
+    async with asyncio.timeout(5):
+        while not (app_1.is_running and app_2.is_running):
+            await asyncio.sleep(0)
+        assert app_1.registry.hub is not None
+        assert app_2.registry.hub is None
+        await app_1.conn_client.add_session(app_1.app_name, "1")
+        await app_2.conn_client.add_session(app_2.app_name, "2")
+
+        # Content shown in app 1 is shown to the user in app 2
+        queue_2 = app_2.conn_client.response_queue[app_2.conn_client._get_url(app_2.app_name, "2")]
+        msg = await queue_2.get()
+        assert msg["data"]["id"] == "button"
+
+        while len(app_2.callbacks_message) == 0:
+            await asyncio.sleep(0.001)
+        await app_1.conn_client._add_request(app_1.app_name, "1", {"id": "button", "value": "a"})
+        await app_2.conn_client._add_request(app_2.app_name, "2", {"id": "button", "value": "b"})
+        while not results:
+            await asyncio.sleep(0.001)
+    assert results == [{"1": {"id": "button", "value": "a"}, "2": {"id": "button", "value": "b"}}]
+
+    for task in tasks:
+        task.cancel()
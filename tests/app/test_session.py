@@ -2,9 +2,14 @@ import asyncio
 from typing import List
 import pytest
 
+from miniappi import settings
 from miniappi.core import App, Session
-from miniappi.core.connection import Message
-from miniappi.core.models.message_types import PutRoot
+from miniappi.core.connection import Message, EncodedMessage, AbstractUserConnection, UserSessionArgs
+from miniappi.core.models.message_types import PutRoot, PutRef, PushRight
+from miniappi.core.models.extensions import ExtendRight
+from miniappi.core.utils.coalesce import coalesce
+from miniappi.core.router import MessageRouter
+from miniappi.core.models.callbacks import OnMessageConfig
 
 from miniappi.testing.external import listen
 from miniappi.content import Loading
@@ -70,3 +75,385 @@ async def test_receive_input(mock_server):
             "value": "pressed"
         }
     ]
+
+@pytest.mark.asyncio
+async def test_send_encoded(mock_server):
+    stream = App()
+
+    msg = EncodedMessage.encode(
+        PutRoot(data=Loading(id="mycomp")).model_dump(exclude_none=True)
+    )
+    assert msg.digest == EncodedMessage.encode(msg.data).digest
+    assert msg.digest != EncodedMessage.encode({"type": "root"}).digest
+
+    @stream.on_open(pass_session=True)
+    async def send_messages(session: Session):
+        assert session._format_send_message(msg) is msg
+        await session.send(msg)
+
+    asyncio.create_task(stream.start())
+    async with listen(
+        stream,
+        request_id="1",
+    ) as handler:
+        ...
+
+    assert [
+        msg.data
+        for msg in handler.sent
+    ] == [
+        {
+            "type": "root",
+            "method": "put",
+            "data": {
+                "contentType": "Loading.vue",
+                "id": "mycomp"
+            }
+        }
+    ]
+
+@pytest.mark.asyncio
+async def test_send_queue(mock_server, monkeypatch):
+    monkeypatch.setattr(settings, "send_queue_size", 0)
+    stream = App()
+    ready = asyncio.Event()
+
+    @stream.on_open(pass_session=True)
+    async def send_messages(session: Session):
+        assert session.outbound is not None
+        await session.send(PutRoot(data=Loading(id="first")))
+        await session.send(PutRoot(data=Loading(id="second")))
+        assert session.queue_depth_max >= 1
+        await session.flush()
+        assert session.queue_depth == 0
+        ready.set()
+
+    asyncio.create_task(stream.start())
+    async with listen(
+        stream,
+        request_id="1",
+    ) as handler:
+        await ready.wait()
+
+    assert [
+        msg.data["data"]["id"]
+        for msg in handler.sent
+    ] == ["first", "second"]
+
+@pytest.mark.asyncio
+async def test_send_queue_drop_oldest(mock_server, monkeypatch):
+    monkeypatch.setattr(settings, "send_queue_size", 2)
+    monkeypatch.setattr(settings, "send_queue_policy", "drop-oldest")
+    stream = App()
+    release = asyncio.Event()
+    ready = asyncio.Event()
+
+    @stream.on_open(pass_session=True)
+    async def send_messages(session: Session):
+        send = session.start_conn.send
+        async def slow_send(body):
+            await release.wait()
+            await send(body)
+        session.start_conn.send = slow_send
+
+        for i in range(5):
+            await session.send(PutRoot(data=Loading(id=str(i))))
+        assert session.queue_depth == 2
+        assert session.n_dropped == 3
+        release.set()
+        await session.flush()
+        ready.set()
+
+    asyncio.create_task(stream.start())
+    async with listen(
+        stream,
+        request_id="1",
+    ) as handler:
+        await ready.wait()
+
+    assert [
+        msg.data["data"]["id"]
+        for msg in handler.sent
+    ] == ["3", "4"]
+
+@pytest.mark.asyncio
+async def test_send_queue_disconnect(mock_server, monkeypatch):
+    monkeypatch.setattr(settings, "send_queue_size", 1)
+    monkeypatch.setattr(settings, "send_queue_policy", "disconnect")
+    stream = App()
+    closed = asyncio.Event()
+
+    @stream.on_open(pass_session=True)
+    async def send_messages(session: Session):
+        async def slow_send(body):
+            await asyncio.Event().wait()
+        session.start_conn.send = slow_send
+        for i in range(3):
+            await session.send(PutRoot(data=Loading(id=str(i))))
+        await asyncio.Event().wait()
+
+    @stream.on_close()
+    async def user_left(*args):
+        closed.set()
+
+    asyncio.create_task(stream.start())
+    async with listen(
+        stream,
+        request_id="1",
+    ) as handler:
+        await closed.wait()
+
+    assert stream.sessions == {}
+
+@pytest.mark.asyncio
+async def test_send_queue_close_blocked(monkeypatch):
+    monkeypatch.setattr(settings, "send_queue_size", 1)
+    monkeypatch.setattr(settings, "send_queue_policy", "block")
+
+    class HangingConnection(AbstractUserConnection):
+        async def send(self, data):
+            await asyncio.Event().wait()
+
+        async def listen(self):
+            yield
+
+    session = Session(HangingConnection(), UserSessionArgs(request_id="1"), MessageRouter(), {})
+    async with asyncio.TaskGroup() as tg:
+        session.start_writer(tg)
+        # Writer hangs with the first and the queue is full
+        await session.send(PutRoot(data=Loading(id="1")))
+        await asyncio.sleep(0)
+        await session.send(PutRoot(data=Loading(id="2")))
+        blocked = tg.create_task(session.send(PutRoot(data=Loading(id="3"))))
+        await asyncio.sleep(0)
+
+        await session.close(send_stop=False)
+        await blocked
+        async with asyncio.timeout(1):
+            await session.flush()
+    assert session.n_dropped == 2
+
+def test_coalesce():
+    msgs = [
+        PushRight(id="feed", data=1),
+        PushRight(id="feed", data=2),
+        PushRight(id="other", data=3),
+        PutRoot(data=Loading(id="first")),
+        PutRoot(data=Loading(id="second")),
+        PutRef(id="ref", data=[1]),
+        PutRef(id="ref", data=[2]),
+        PushRight(id="feed", data=4),
+        ExtendRight(id="feed", data=[5, 6]),
+    ]
+    output = coalesce([
+        EncodedMessage.encode(msg.model_dump(exclude_none=True))
+        for msg in msgs
+    ])
+    assert [msg.data for msg in output] == [
+        {"type": "ref", "method": "extend", "id": "feed", "data": [1, 2]},
+        {"type": "ref", "method": "push", "id": "other", "data": 3},
+        {"type": "root", "method": "put", "data": {"contentType": "Loading.vue", "id": "second"}},
+        {"type": "ref", "method": "put", "id": "ref", "data": [2]},
+        {"type": "ref", "method": "extend", "id": "feed", "data": [4, 5, 6]},
+    ]
+
+@pytest.mark.asyncio
+async def test_send_coalesce(mock_server, monkeypatch):
+    monkeypatch.setattr(settings, "send_coalesce_window", 0.01)
+    stream = App()
+    ready = asyncio.Event()
+
+    @stream.on_open(pass_session=True)
+    async def send_messages(session: Session):
+        for i in range(5):
+            await session.send(PushRight(id="feed", data=i))
+        await session.flush()
+        ready.set()
+
+    asyncio.create_task(stream.start())
+    async with listen(
+        stream,
+        request_id="1",
+    ) as handler:
+        await ready.wait()
+
+    assert [
+        msg.data
+        for msg in handler.sent
+    ] == [
+        {"type": "ref", "method": "extend", "id": "feed", "data": [0, 1, 2, 3, 4]},
+    ]
+
+@pytest.mark.asyncio
+async def test_send_many(mock_server):
+    stream = App()
+    ready = asyncio.Event()
+
+    @stream.on_open(pass_session=True)
+    async def send_messages(session: Session):
+        await session.send_many([
+            PutRoot(data=Loading(id="mycomp")),
+            PushRight(id="feed", data=1),
+        ])
+        async with session.transaction():
+            await session.send(PushRight(id="feed", data=2))
+            await Loading(id="other").show()
+        with pytest.raises(RuntimeError):
+            async with session.transaction():
+                await session.send(PushRight(id="feed", data=3))
+                raise RuntimeError("Intentional")
+        ready.set()
+
+    asyncio.create_task(stream.start())
+    async with listen(
+        stream,
+        request_id="1",
+    ) as handler:
+        await ready.wait()
+
+    assert [
+        msg.data
+        for msg in handler.sent
+    ] == [
+        {
+            "type": "batch",
+            "data": [
+                {"type": "root", "method": "put", "data": {"contentType": "Loading.vue", "id": "mycomp"}},
+                {"type": "ref", "method": "push", "id": "feed", "data": 1},
+            ]
+        },
+        {
+            "type": "batch",
+            "data": [
+                {"type": "ref", "method": "push", "id": "feed", "data": 2},
+                {"type": "root", "method": "put", "data": {"contentType": "Loading.vue", "id": "other"}},
+            ]
+        },
+    ]
+
+@pytest.mark.asyncio
+async def test_transaction_other_task(mock_server):
+    stream = App()
+    ready = asyncio.Event()
+
+    @stream.on_open(pass_session=True)
+    async def send_messages(session: Session):
+        started = asyncio.Event()
+
+        async def send_other():
+            await started.wait()
+            await session.send(PutRoot(data=Loading(id="other")))
+
+        # Not part of the transaction
+        other = asyncio.create_task(send_other())
+        with pytest.raises(RuntimeError):
+            async with session.transaction():
+                await session.send(PushRight(id="feed", data=1))
+                started.set()
+                await other
+                raise RuntimeError("Intentional")
+        ready.set()
+
+    asyncio.create_task(stream.start())
+    async with listen(
+        stream,
+        request_id="1",
+    ) as handler:
+        await ready.wait()
+
+    assert [msg.data for msg in handler.sent] == [
+        {"type": "root", "method": "put", "data": {"contentType": "Loading.vue", "id": "other"}},
+    ]
+
+@pytest.mark.asyncio
+async def test_dispatch_concurrent(mock_server):
+    stream = App(message_dispatch="concurrent")
+    release = asyncio.Event()
+    handled = []
+
+    @stream.on_message()
+    async def handle(message: Message):
+        if message.data["id"] == "slow":
+            await release.wait()
+        handled.append((message.data["id"], message.data["value"]))
+        if message.data["id"] == "fast":
+            release.set()
+
+    asyncio.create_task(stream.start())
+    async with listen(
+        stream,
+        request_id="1",
+    ) as handler:
+        await handler.send_message({"id": "slow", "value": 1})
+        await handler.send_message({"id": "slow", "value": 2})
+        await handler.send_message({"id": "fast", "value": 3})
+
+    assert handled == [("fast", 3), ("slow", 1), ("slow", 2)]
+
+@pytest.mark.asyncio
+async def test_dispatch_pool(mock_server):
+    stream = App(message_dispatch="pool")
+    handled = []
+
+    @stream.on_message()
+    async def handle(message: Message):
+        await asyncio.sleep(0)
+        handled.append((message.data["id"], message.data["value"]))
+
+    asyncio.create_task(stream.start())
+    async with listen(
+        stream,
+        request_id="1",
+    ) as handler:
+        for i in range(5):
+            await handler.send_message({"id": "a", "value": i})
+            await handler.send_message({"id": "b", "value": i})
+
+    assert [value for id, value in handled if id == "a"] == list(range(5))
+    assert [value for id, value in handled if id == "b"] == list(range(5))
+
+def test_router():
+    router = MessageRouter()
+    async def func(msg): ...
+    cb_any = OnMessageConfig(func)
+    cb_id = OnMessageConfig(func, ids=["a", "b"])
+    cb_request = OnMessageConfig(func, request_id="1")
+    cb_both = OnMessageConfig(func, ids=["a"], request_id="2")
+    for cb in (cb_id, cb_any, cb_request, cb_both):
+        router.append(cb)
+
+    def match(id, request_id):
+        return router.match(Message(url="", request_id=request_id, data={"id": id}))
+
+    assert match("a", "1") == (cb_id, cb_any, cb_request)
+    assert match("a", "2") == (cb_id, cb_any, cb_both)
+    assert match("b", "3") == (cb_id, cb_any)
+    assert match("c", "3") == (cb_any,)
+    assert router.match(Message(url="", request_id="1", data="text")) == (cb_any, cb_request)
+
+    matched = match("c", "3")
+    router.remove(cb_id)
+    router.remove(cb_any)
+    # Not changed by removing
+    assert matched == (cb_any,)
+    assert match("a", "2") == (cb_both,)
+    assert list(router) == [cb_request, cb_both]
+    assert router[-1] is cb_both
+
+@pytest.mark.asyncio
+async def test_on_message_id(mock_server):
+    stream = App()
+
+    messages: List[Message] = []
+    @stream.on_message(id="my-button", request_id="1")
+    async def button_pressed(message: Message):
+        messages.append(message)
+
+    asyncio.create_task(stream.start())
+    async with listen(stream, request_id="1") as handler_1:
+        async with listen(stream, request_id="2") as handler_2:
+            await handler_1.send_message({"id": "other", "value": 1})
+            await handler_2.send_message({"id": "my-button", "value": 2})
+            await handler_1.send_message({"id": "my-button", "value": 3})
+
+    assert [msg.data["value"] for msg in messages] == [3]
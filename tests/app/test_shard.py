@@ -0,0 +1,165 @@
+import asyncio
+import socket
+import pytest
+
+from miniappi import settings
+from miniappi.core import App, broadcast
+from miniappi.core.connection.mock import MockClient
+from miniappi.core.connection.multiplex import MultiplexWebsocketClient
+from miniappi.core.shard import ShardedApp, ShardChannel, Shard, setup_shard
+from miniappi.content import v0
+from miniappi.testing.server import LocalServer
+
+def create_app():
+    app = App()
+
+    @app.on_open()
+    async def join():
+        await broadcast(v0.Title(id="joined", text=str(app.conn_client.index)))
+    return app
+
+class InProcessShardedApp(ShardedApp):
+    "Shards as tasks sharing the mock client"
+
+    def _spawn(self, index):
+        parent_sock, child_sock = socket.socketpair()
+        app = self.app_factory()
+        setup_shard(app, ShardChannel(child_sock), index)
+        shard = Shard(index, ShardChannel(parent_sock))
+        shard.task = asyncio.create_task(app.start(echo_link=False))
+        return shard
+
+@pytest.mark.asyncio
+async def test_sharded_in_process():
+    client = MockClient()
+
+    def factory():
+        app = create_app()
+        app.conn_client = client
+        return app
+
+    runner = InProcessShardedApp(factory, workers=2, balance="round-robin")
+    task = asyncio.create_task(runner.start(echo_link=False))
+    async with asyncio.timeout(5):
+        while not runner.app.is_running:
+            await asyncio.sleep(0)
+        await client.add_session(app_name=runner.app.app_name, request_id="1")
+        await client.add_session(app_name=runner.app.app_name, request_id="2")
+
+        queues = [client.response_queue[client._get_url(runner.app.app_name, rid)] for rid in ("1", "2")]
+        # Both users get the broadcasts of both shards
+        for queue in queues:
+            texts = {(await queue.get())["data"]["text"] for _ in range(2)}
+            assert texts == {"0", "1"}
+    assert [shard.n_sessions for shard in runner.shards] == [1, 1]
+    assert runner.n_relayed == 2
+
+    task.cancel()
+    for shard in runner.shards:
+        shard.task.cancel()
+
+@pytest.mark.asyncio
+async def test_sharded_large_broadcast():
+    # Bigger than the socket buffers: sending
+    # must not block the loop
+    client = MockClient()
+    text = "x" * 500_000
+
+    def factory():
+        app = App()
+        app.conn_client = client
+
+        @app.on_open()
+        async def join():
+            for i in range(5):
+                await broadcast(v0.Title(id=f"big-{i}", text=text))
+        return app
+
+    runner = InProcessShardedApp(factory, workers=2, balance="round-robin")
+    task = asyncio.create_task(runner.start(echo_link=False))
+    async with asyncio.timeout(10):
+        while not runner.app.is_running:
+            await asyncio.sleep(0)
+        await client.add_session(app_name=runner.app.app_name, request_id="1")
+        await client.add_session(app_name=runner.app.app_name, request_id="2")
+        queue = client.response_queue[client._get_url(runner.app.app_name, "1")]
+        for _ in range(10):
+            assert len((await queue.get())["data"]["text"]) == len(text)
+    assert runner.n_relayed == 10
+
+    task.cancel()
+    for shard in runner.shards:
+        shard.task.cancel()
+
+@pytest.mark.asyncio
+async def test_sharded_processes():
+    client = MockClient()
+
+    def factory():
+        app = create_app()
+        app.conn_client = client
+        return app
+
+    runner = ShardedApp(factory, workers=2)
+    task = asyncio.create_task(runner.start(echo_link=False))
+    async with asyncio.timeout(10):
+        while not runner.app.is_running:
+            await asyncio.sleep(0.01)
+        for rid in ("1", "2", "3"):
+            await client.add_session(app_name=runner.app.app_name, request_id=rid)
+        while runner.n_relayed < 3:
+            await asyncio.sleep(0.01)
+    # Least loaded
+    assert sorted(shard.n_sessions for shard in runner.shards) == [1, 2]
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not any(shard.process.is_alive() for shard in runner.shards)
+
+def test_shard_metrics_port(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_port", 9100)
+    ports = []
+    for index in range(3):
+        app = App()
+        sock, other = socket.socketpair()
+        setup_shard(app, ShardChannel(sock), index)
+        ports.append(app.metrics_port)
+        sock.close()
+        other.close()
+    # Runner serves 9100
+    assert ports == [9101, 9102, 9103]
+
+@pytest.mark.asyncio
+async def test_sharded_multiplex():
+    server = LocalServer()
+    async with server.client() as client:
+
+        def factory():
+            app = App()
+            app.conn_client = MultiplexWebsocketClient(client=client, connections=1)
+
+            @app.on_open()
+            async def join():
+                button = v0.widgets.Button(id="button", label="Press")
+                data = await button.wait_input()
+                await v0.Title(id="reply", text=str(data["value"])).show()
+            return app
+
+        runner = InProcessShardedApp(factory, workers=2, balance="round-robin")
+        task = asyncio.create_task(runner.start(echo_link=False))
+        async with asyncio.timeout(10):
+            await server.wait_app()
+            users = await server.add_users(2)
+            for user in users:
+                msg = await user.receive()
+                assert msg["data"]["id"] == "button"
+                await user.send({"id": "button", "value": user.request_id})
+                msg = await user.receive()
+                assert msg["data"]["text"] == user.request_id
+        # Each shard multiplexes its own sessions
+        assert server.n_channels == 2
+
+        task.cancel()
+        for shard in runner.shards:
+            shard.task.cancel()
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+
+from miniappi.core import App
+from miniappi.core.connection import Message
+from miniappi.core.tracing import HookTracer, Tracer
+from miniappi.testing.external import listen
+from miniappi.content import v0
+
+@pytest.mark.asyncio
+async def test_hook_tracer(mock_server):
+    app = App()
+    records = []
+    app.tracer = HookTracer([records.append])
+
+    @app.on_message(id="my-button")
+    async def pressed(msg: Message):
+        await v0.Title(id="reply", text="pressed").show()
+
+    asyncio.create_task(app.start())
+    async with listen(app, request_id="1", wait_close=False) as handler:
+        await handler.send_message({"id": "my-button"})
+        await handler.get_next_sent()
+        await app.sessions["1"].close()
+
+    names = [record.name for record in records]
+    for name in (
+        "miniappi.session.connect",
+        "miniappi.session.enter_context",
+        "miniappi.session.start_callbacks",
+        "miniappi.session.open",
+        "miniappi.message.callback",
+        "miniappi.message.send",
+        "miniappi.message.receive",
+        "miniappi.session.close",
+    ):
+        assert name in names
+    assert names.index("miniappi.session.open") < names.index("miniappi.message.receive")
+
+    spans = {record.name: record for record in records}
+    assert spans["miniappi.message.receive"].attributes["content_id"] == "my-button"
+    assert spans["miniappi.message.receive"].attributes["size"] > 0
+    callbacks = [record.attributes["callback"] for record in records if record.name == "miniappi.message.callback"]
+    assert any(name.endswith("pressed") for name in callbacks)
+    assert spans["miniappi.message.send"].attributes["size"] > 0
+    assert all(record.duration >= 0 for record in records)
+
+def test_noop_tracer():
+    tracer = Tracer()
+    with tracer.start("a", key="value") as span:
+        span.set("other", 1)
+    assert not tracer.enabled
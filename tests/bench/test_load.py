@@ -0,0 +1,35 @@
+import pytest
+
+from miniappi.bench import BenchConfig, run
+
+@pytest.mark.asyncio
+async def test_run():
+    config = BenchConfig(users=5, messages=3, broadcasts=2)
+    report = await run(config)
+
+    assert len(report.open_latencies) == 5
+    assert len(report.input_latencies) == 15
+    assert report.messages_in == 15
+    # Initial content, broadcasts and replies
+    assert report.messages_out == 5 + 5 * 2 + 15
+    assert report.memory_per_session > 0
+    assert "Users:" in report.format()
+
+@pytest.mark.asyncio
+async def test_run_websocket():
+    config = BenchConfig(users=3, messages=2, broadcasts=1, measure_memory=False)
+    report = await run(config, transport="websocket")
+
+    assert len(report.input_latencies) == 6
+    assert report.messages_out == 3 + 3 * 1 + 6
+    assert report.memory_per_session is None
+
+def test_micro():
+    from miniappi.bench.micro import bench_context
+    results = bench_context(number=100)
+    assert all(ns > 0 for ns in results.values())
+
+def test_micro_session():
+    from miniappi.bench.micro import bench_session_open
+    results = bench_session_open(number=10, n_vars=10)
+    assert all(ns > 0 for ns in results.values())
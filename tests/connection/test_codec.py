@@ -0,0 +1,65 @@
+import json
+import pytest
+
+from miniappi.core import Session
+from miniappi.core.connection import EncodedMessage, AbstractUserConnection, UserSessionArgs
+from miniappi.core.connection.codec import Codec, create_codec
+from miniappi.core.models.message_types import PutRoot
+from miniappi.core.router import MessageRouter
+from miniappi.content import Loading
+
+def test_stdlib_codec():
+    codec = create_codec("json")
+    assert type(codec) is Codec
+    text = codec.dumps({"a": [1, "b"]})
+    assert codec.loads(text) == {"a": [1, "b"]}
+    assert codec.loads(text.encode()) == {"a": [1, "b"]}
+
+def test_auto_codec():
+    codec = create_codec("auto")
+    assert codec.name in ("json", "orjson", "msgspec")
+    assert codec.loads(codec.dumps({"a": 1})) == {"a": 1}
+    assert create_codec(codec) is codec
+
+@pytest.mark.parametrize("name", ["orjson", "msgspec"])
+def test_optional_codec(name):
+    try:
+        codec = create_codec(name)
+    except ImportError:
+        pytest.skip(f"{name} not installed")
+    assert codec.loads(codec.dumps({"a": [1, "ä"]})) == {"a": [1, "ä"]}
+    # Same keys as with the standard library
+    data = {1: "a", 2.5: "b", True: "c", None: "d"}
+    assert codec.loads(codec.dumps(data)) == json.loads(json.dumps(data))
+
+def test_encoded_from_json():
+    msg = EncodedMessage.from_json(b'{"a": 1}')
+    assert msg.text == '{"a": 1}'
+    assert msg.data == {"a": 1}
+
+class MarkedCodec(Codec):
+    name = "marked"
+
+    def dumps(self, data):
+        return "marked:" + super().dumps(data)
+
+class CodecConnection(AbstractUserConnection):
+    codec = MarkedCodec()
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, data):
+        self.sent.append(data)
+
+    async def listen(self):
+        yield
+
+@pytest.mark.asyncio
+async def test_session_uses_connection_codec():
+    conn = CodecConnection()
+    session = Session(conn, UserSessionArgs(request_id="1"), MessageRouter(), {})
+    assert session.codec is conn.codec
+    await session.send(PutRoot(data=Loading(id="1")))
+    await session.send_many([PutRoot(data=Loading(id="2")), PutRoot(data=Loading(id="3"))])
+    assert [body.text.startswith("marked:") for body in conn.sent] == [True, True]
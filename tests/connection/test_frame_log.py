@@ -0,0 +1,26 @@
+import logging
+
+from miniappi.core.logging import FrameLog
+
+def test_frame_log_summary(caplog):
+    logger = logging.getLogger("miniappi.test.frames")
+    frames = FrameLog(logger, "1", interval=0)
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        frames.sent()
+        frames.received()
+        frames.close()
+    messages = [record.getMessage() for record in caplog.records]
+    # No records of single frames on INFO
+    assert "Message sent" not in messages
+    assert messages[0] == "Session 1: 1 messages sent, 0 received in 0 s"
+    assert messages[-1] == "Session 1 ended: 1 messages sent, 1 received"
+    assert caplog.records[-1].messages_received == 1
+
+def test_frame_log_debug(caplog):
+    logger = logging.getLogger("miniappi.test.frames")
+    frames = FrameLog(logger, "1")
+    with caplog.at_level(logging.DEBUG, logger=logger.name):
+        frames.sent()
+        frames.received()
+    assert [record.getMessage() for record in caplog.records] == ["Message sent", "Message received"]
+    assert frames.n_sent == 1
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+
+from miniappi import App, content
+from miniappi.core.connection.websocket import WebsocketClient
+from miniappi.testing.server import LocalServer
+
+def create_app(client):
+    app = App()
+    app.conn_client = WebsocketClient(client=client)
+
+    @app.on_open()
+    async def join():
+        button = content.v0.widgets.Button(id="button", label="Press")
+        while True:
+            data = await button.wait_input()
+            await content.v0.Title(id="reply", text=str(data["value"])).show()
+    return app
+
+@pytest.mark.asyncio
+async def test_messaging():
+    server = LocalServer(ping_interval=0.01)
+    async with server.client() as client:
+        app = create_app(client)
+        task = asyncio.create_task(app.start(echo_link=False))
+        async with asyncio.timeout(10):
+            await server.wait_app()
+            user_1, user_2 = await server.add_users(2)
+
+            for user in (user_1, user_2):
+                msg = await user.receive()
+                assert msg["data"]["id"] == "button"
+                await user.ping()
+                await user.send({"id": "button", "value": user.request_id})
+                msg = await user.receive()
+                assert msg["data"] == {"id": "reply", "text": user.request_id, "contentType": "v0/Title.vue"}
+
+            await user_1.leave()
+            await user_1.disconnected.wait()
+            while user_1.request_id in app.sessions:
+                await asyncio.sleep(0)
+            assert list(app.sessions) == [user_2.request_id]
+
+            await server.close()
+            while app.is_running:
+                await asyncio.sleep(0)
+    assert server.n_app_connects == 1
+    assert server.client_conf["app_name"] is None
+    task.cancel()
+
+@pytest.mark.asyncio
+async def test_reconnect():
+    server = LocalServer()
+    async with server.client() as client:
+        app = create_app(client)
+        task = asyncio.create_task(app.start(echo_link=False))
+        async with asyncio.timeout(10):
+            await server.wait_app()
+            await server.drop_app()
+            # Users can join after the app recovered
+            user = await server.add_user()
+            msg = await user.receive()
+            assert msg["data"]["id"] == "button"
+            assert server.n_app_connects == 2
+
+            await server.close()
+            while app.is_running:
+                await asyncio.sleep(0)
+    task.cancel()
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+
+from miniappi import App, content
+from miniappi.core.connection.multiplex import MultiplexWebsocketClient, _frame
+from miniappi.core.connection import EncodedMessage
+from miniappi.testing.server import LocalServer
+
+def create_app(client, connections=2):
+    app = App()
+    app.conn_client = MultiplexWebsocketClient(client=client, connections=connections)
+
+    @app.on_open()
+    async def join():
+        button = content.v0.widgets.Button(id="button", label="Press")
+        while True:
+            data = await button.wait_input()
+            await content.v0.Title(id="reply", text=str(data["value"])).show()
+    return app
+
+def test_frame():
+    assert _frame("open", "a") == '{"type":"open","request_id":"a"}'
+    assert _frame("data", "a", {"x": 1}) == '{"type":"data","request_id":"a","data":{"x": 1}}'
+    assert _frame("data", "a", EncodedMessage.encode("y")) == '{"type":"data","request_id":"a","data":"y"}'
+
+@pytest.mark.asyncio
+async def test_messaging():
+    server = LocalServer()
+    async with server.client() as client:
+        app = create_app(client)
+        task = asyncio.create_task(app.start(echo_link=False))
+        async with asyncio.timeout(10):
+            await server.wait_app()
+            users = await server.add_users(5)
+
+            for user in users:
+                msg = await user.receive()
+                assert msg["data"]["id"] == "button"
+                await user.send({"id": "button", "value": user.request_id})
+                msg = await user.receive()
+                assert msg["data"]["text"] == user.request_id
+
+            # Sessions share the channels
+            assert server.n_channels == 2
+            assert sorted(len(channel.sessions) for channel in app.conn_client.channels) == [2, 3]
+
+            await users[0].leave()
+            await users[0].disconnected.wait()
+            while users[0].request_id in app.sessions:
+                await asyncio.sleep(0)
+            assert len(app.sessions) == 4
+
+            await server.close()
+            while app.is_running:
+                await asyncio.sleep(0)
+    assert not app.conn_client.channels
+    task.cancel()
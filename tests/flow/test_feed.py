@@ -28,6 +28,25 @@ def test_defaults():
         "reference": "myref"
     }
 
+def test_ring_buffer():
+    feed = Feed[int](list(range(5)), limit=3, method="fifo")
+    buffer = feed.data
+    for i in range(5, 10):
+        feed._add(i)
+    # Appended in place
+    assert feed.data is buffer
+    assert feed.data == [7, 8, 9]
+    assert feed.model_dump()["data"] == [7, 8, 9]
+    assert type(feed.model_dump()["data"]) is list
+
+    feed = Feed[int](list(range(5)), limit=3, method="lifo")
+    feed._add(5)
+    assert feed.data == [0, 1, 2]
+
+    feed = Feed[int](list(range(5)), limit=3, method="ignore")
+    feed._add(5)
+    assert feed.data == [0, 1, 2, 3, 4, 5]
+
 @pytest.mark.asyncio
 async def test_feed(mock_server):
     app = App()
@@ -115,6 +134,50 @@ async def test_lifo(mock_server):
     ) as handler:
         await ready.wait()
 
+async def test_extend_replace(mock_server):
+    app = App()
+    feed = Feed[int]([0], method="fifo", limit=3, id="myfeed")
+    ready = asyncio.Event()
+
+    @app.on_open()
+    async def run_app():
+        await content.v0.layouts.Column(
+            id="my-col",
+            contents=feed
+        ).show()
+        await feed.extend(range(1, 500))
+        assert feed.data == [497, 498, 499]
+        await feed.replace(["a", "b", "c", "d"])
+        assert feed.data == ["b", "c", "d"]
+        ready.set()
+
+    asyncio.create_task(app.start())
+    async with listen(
+        app,
+        request_id="1",
+    ) as handler:
+        await ready.wait()
+
+    assert [msg.data for msg in handler.sent[1:]] == [
+        {"type": "ref", "method": "extend", "id": "myfeed", "data": [497, 498, 499]},
+        {"type": "ref", "method": "put", "id": "myfeed", "data": ["b", "c", "d"]},
+    ]
+
+async def test_extend_lifo():
+    class FakeSession:
+        def __init__(self):
+            self.sent = []
+        async def send(self, data):
+            self.sent.append(data.model_dump())
+
+    session = FakeSession()
+    feed = Feed[int]([0, 1], method="lifo", limit=3, id="myfeed")
+    await feed.extend([2, 3, 4], session=session)
+    assert feed.data == [0, 1, 2]
+    # Full, nothing to send
+    await feed.extend([5], session=session)
+    assert [msg["data"] for msg in session.sent] == [[2]]
+
 @pytest.mark.asyncio
 async def test_app_scope(mock_server):
     app = App()
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from miniappi import App
+from miniappi.testing.external import listen
+from miniappi.ref import Record
+from miniappi import content
+
+def test_defaults():
+    record = Record[int]({"a": 1}, id="myref")
+    assert record.scope == "auto"
+    assert record["a"] == 1
+    assert "a" in record
+    assert len(record) == 1
+    assert record.model_dump() == {
+        "type": "record",
+        "data": {"a": 1},
+        "limit": 100,
+        "reference": "myref"
+    }
+    with pytest.raises(ValueError):
+        Record({"a": 1, "b": 2}, limit=1)
+
+async def test_record(mock_server):
+    app = App()
+    record = Record[str]({"cpu": "0 %"}, limit=3, id="myrecord")
+    ready = asyncio.Event()
+
+    @app.on_open()
+    async def run_app():
+        await content.v0.cards.Card(
+            id="my-card",
+            body=record
+        ).show()
+        await record.set("cpu", "12 %")
+        await record.update({"memory": "1 GB", "disk": "2 GB"})
+        assert await record.pop("disk") == "2 GB"
+        assert await record.pop("disk", None) is None
+        with pytest.raises(ValueError):
+            await record.update({"a": "", "b": ""})
+        ready.set()
+
+    asyncio.create_task(app.start())
+    async with listen(
+        app,
+        request_id="1",
+    ) as handler:
+        await ready.wait()
+
+    assert handler.sent[0].data["data"]["body"] == {
+        "data": {"cpu": "0 %"},
+        "limit": 3,
+        "reference": "myrecord",
+        "type": "record",
+    }
+    assert [msg.data for msg in handler.sent[1:]] == [
+        {"type": "ref", "method": "push", "id": "myrecord", "key": "cpu", "data": "12 %"},
+        {"type": "batch", "data": [
+            {"type": "ref", "method": "push", "id": "myrecord", "key": "memory", "data": "1 GB"},
+            {"type": "ref", "method": "push", "id": "myrecord", "key": "disk", "data": "2 GB"},
+        ]},
+        {"type": "ref", "method": "pop", "id": "myrecord", "key": "disk"},
+    ]
+    assert record.data == {"cpu": "12 %", "memory": "1 GB"}